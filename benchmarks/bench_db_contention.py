@@ -0,0 +1,214 @@
+"""
+多进程并发写入压测：模拟多个 gunicorn worker 同时保存聊天记录，比较数据库配置。
+
+每个写进程用自己的会话循环调用 save_turn（ChatLog + EmotionLog 单事务，汇总表/统计信号照常执行），
+默认每轮再保存一次数据库 session；同时有 --readers 个进程每隔 --read-interval-ms 读取一个已有会话的趋势数据
+（最近一页 + 分桶），直到写入结束。统计写入吞吐、单轮写入延迟、读取延迟和 "database is locked" 等错误次数。
+
+- sqlite_rollback：原来的配置（回滚日志、默认 5 秒等待、延迟事务）
+- sqlite_wal：settings 里的 SQLite 配置（WAL、synchronous=NORMAL、busy timeout、IMMEDIATE 事务）
+- postgres：DB_ENGINE=postgres 时代替 sqlite_wal，在同一台服务器上新建 <DB_NAME>_bench 库，跑完删除
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_db_contention --workers 8 --turns 200 --json contention.json
+    DB_ENGINE=postgres DB_HOST=... python -m benchmarks.bench_db_contention --workers 16
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import print_table, summarize, write_json
+
+
+def _setup_django(database):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    import django
+    from django.conf import settings
+
+    settings.DATABASES = {"default": database}
+    settings.TREND_READ_DATABASE = "default"
+    django.setup()
+
+
+def _configs(workdir):
+    from companion_project import settings as project
+
+    configs = {"sqlite_rollback": {"ENGINE": "django.db.backends.sqlite3",
+                                   "NAME": os.path.join(workdir, "rollback.sqlite3")}}
+    default = project.DATABASES["default"]
+    if project.DB_ENGINE == "postgres":
+        configs["postgres"] = dict(default, TEST={"NAME": f"{default['NAME']}_bench"})
+    else:
+        configs["sqlite_wal"] = dict(default, NAME=os.path.join(workdir, "wal.sqlite3"))
+    for config in configs.values():
+        config.setdefault("TEST", {"NAME": config["NAME"]})
+    return configs
+
+
+def _prepare(database, seed_turns, writers):
+    """建库、迁移，写入一个供读取的会话并为每个写进程建好会话和 session，返回 (库名, 读取的会话 id, [(会话 id, session key)])"""
+    _setup_django(database)
+    from django.db import connection
+
+    name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    from django.contrib.sessions.backends.db import SessionStore
+
+    from chat.models import ChatSession
+    from chat.views import save_turn
+
+    session = ChatSession.objects.create()
+
+    async def seed():
+        for i in range(seed_turns):
+            await save_turn(session, f"message {i}", "happy", "neutral", "I'm here with you.")
+
+    asyncio.run(seed())
+    owners = []
+    for _ in range(writers):
+        store = SessionStore()
+        store.create()
+        owners.append((ChatSession.objects.create().id, store.session_key))
+    return name, session.id, owners
+
+
+def _destroy(database, name):
+    _setup_django(dict(database, NAME=name))
+    from django.db import connection
+
+    connection.creation.destroy_test_db(name, verbosity=0)
+
+
+_done = None
+
+
+def _init_worker(done):
+    global _done
+    _done = done
+
+
+def _read(task):
+    database, session_id, interval, start_at = task
+    _setup_django(database)
+    from django.db import OperationalError
+
+    from chat import rollups
+    from chat.models import EmotionLog
+
+    latencies, errors = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    while not _done.is_set():
+        start = time.perf_counter()
+        try:
+            list(EmotionLog.objects.filter(session_id=session_id).order_by("-timestamp", "-id")[:500])
+            rollups.query(session_id, "minute")
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+    return latencies, errors
+
+
+def _write(task):
+    database, (session_id, session_key), turns, with_session, start_at = task
+    _setup_django(database)
+    from django.contrib.sessions.backends.base import UpdateError
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import OperationalError
+
+    from chat.models import ChatSession
+    from chat.views import save_turn
+
+    session = ChatSession(id=session_id)
+    store = SessionStore(session_key)
+    latencies, errors = [], 0
+
+    async def run():
+        nonlocal errors
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        for i in range(turns):
+            start = time.perf_counter()
+            try:
+                await save_turn(session, f"message {i}", "sad", "neutral", "I'm here with you.")
+                if with_session:
+                    await store.aset("last_turn", i)
+                    await store.asave()
+            except (OperationalError, UpdateError):
+                # session 保存时的 "database is locked" 会被包装成 UpdateError
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    asyncio.run(run())
+    return latencies, errors
+
+
+def _in_child(ctx, fn, *args):
+    with ctx.Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def _merge(results):
+    return [value for latencies, _ in results for value in latencies], sum(errors for _, errors in results)
+
+
+def _run(ctx, database, args):
+    name, session_id, owners = _in_child(ctx, _prepare, database, args.seed_turns, args.workers)
+    database = dict(database, NAME=name)
+    done = ctx.Event()
+    try:
+        # 各进程先完成 django.setup()，再在同一时刻开始
+        start_at = time.time() + 3
+        with ctx.Pool(args.workers + args.readers, initializer=_init_worker, initargs=(done,)) as pool:
+            readers = pool.map_async(_read, [(database, session_id, args.read_interval_ms / 1000, start_at)] * args.readers, chunksize=1)
+            writers = pool.map_async(_write, [(database, owner, args.turns, not args.no_session, start_at)
+                                              for owner in owners], chunksize=1)
+            write_results = writers.get()
+            elapsed = time.time() - start_at
+            done.set()
+            read_results = readers.get()
+    finally:
+        _in_child(ctx, _destroy, database, name)
+
+    latencies, errors = _merge(write_results)
+    row = summarize(latencies, elapsed)
+    row["write_errors"] = errors
+    if args.readers:
+        latencies, errors = _merge(read_results)
+        reads = summarize(latencies, elapsed)
+        row.update({"reads": reads["requests"], "read_p50_ms": reads["p50_ms"], "read_p95_ms": reads["p95_ms"],
+                    "read_errors": errors})
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="并发写入的进程数")
+    parser.add_argument("--turns", type=int, default=200, help="每个进程写入的对话轮数")
+    parser.add_argument("--readers", type=int, default=2, help="同时读取趋势数据的进程数")
+    parser.add_argument("--read-interval-ms", type=float, default=100, help="每个读进程两次读取之间的间隔")
+    parser.add_argument("--seed-turns", type=int, default=500, help="供读取的会话预先写入的轮数")
+    parser.add_argument("--configs", help="只跑其中几个，逗号分隔")
+    parser.add_argument("--no-session", action="store_true", help="不模拟每轮的 session 写入")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-db-") as workdir:
+        configs = _configs(workdir)
+        names = args.configs.split(",") if args.configs else list(configs)
+        for name in names:
+            results[name] = _run(ctx, configs[name], args)
+
+    print_table(results)
+    if args.json:
+        write_json(args.json, "db_contention", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+离线压测主要接口：chat_api、chat_stream_api、detect_emotion、trend_view、trend_page_view。
+
+- LLM 请求发往本地 stub（benchmarks.llm_stub），延迟与流式间隔可调，不需要 API key 和网络
+- 摄像头帧用 benchmarks.frames 合成；没有安装 fer 时推理失败按线上逻辑记为 neutral
+- 临时 SQLite 库：先建一个用户和会话并写入 --seed-turns 轮历史（汇总表/统计信号照常执行），
+  每个接口在独立子进程里、基于同一份数据的副本运行，峰值 RSS 互不影响
+- 请求经 Django AsyncClient 在进程内走完整的 ASGI 处理链（不含网络与服务器开销），
+  同步视图与 ASGI 部署一样在同一个线程里串行执行
+- 每个并发 worker 一个登录后的客户端（各自的 session），限流默认关闭
+
+输出每个接口的 p50/p95/p99、吞吐、状态码分布和峰值 RSS；--json 保存结果，--baseline 与上次结果对比。
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_endpoints --requests 200 --concurrency 16 --json endpoints.json
+    python -m benchmarks.bench_endpoints --endpoints trend,trend_page --baseline endpoints.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.common import print_table, summarize, write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ENDPOINTS = ["chat", "chat_stream", "detect_emotion", "trend", "trend_page"]
+MESSAGES = [
+    "I don't really know how I feel about the interview tomorrow.",
+    "My sister finally called me after two months.",
+    "今天加班到很晚，回家路上一直在想工作的事。",
+    "I keep replaying that conversation in my head.",
+    "周末本来想出去走走，结果下了一整天的雨。",
+    "The new apartment is quiet, maybe too quiet.",
+]
+EMOTIONS = ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((rss // 1024 if sys.platform == "darwin" else rss) / 1024, 1)
+
+
+def _setup_django(db_path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.ALLOWED_HOSTS = ["*"]
+    django.setup()
+
+
+def _prepare(db_path, seed_turns):
+    """建表并写入一个会话的历史，返回 {"user_id", "session_id"}"""
+    _setup_django(db_path)
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from chat.models import ChatSession
+    from chat.views import save_turn
+
+    call_command("migrate", verbosity=0)
+    user = get_user_model().objects.create_user("bench", password="bench-password")
+    session = ChatSession.objects.create()
+
+    async def seed():
+        for i in range(seed_turns):
+            await save_turn(session, MESSAGES[i % len(MESSAGES)], EMOTIONS[i % 7], EMOTIONS[(i * 3) % 7],
+                            "I'm here with you.")
+
+    asyncio.run(seed())
+    return {"user_id": user.id, "session_id": session.id}
+
+
+def _request_factory(endpoint, session_id, frames):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    async def chat(client, i):
+        body = {"message": MESSAGES[i % len(MESSAGES)], "emotion": EMOTIONS[i % 7], "style": "friend"}
+        response = await client.post(f"/chat/{session_id}/send/", json.dumps(body),
+                                     content_type="application/json")
+        return response.status_code, None
+
+    async def chat_stream(client, i):
+        body = {"message": MESSAGES[i % len(MESSAGES)], "emotion": EMOTIONS[i % 7], "style": "friend"}
+        start = time.perf_counter()
+        response = await client.post(f"/chat/{session_id}/stream/", json.dumps(body),
+                                     content_type="application/json")
+        first = None
+        if response.streaming:
+            async for chunk in response.streaming_content:
+                if first is None and b"event: token" in chunk:
+                    first = time.perf_counter() - start
+        return response.status_code, first
+
+    async def detect_emotion(client, i):
+        frame = SimpleUploadedFile("frame.jpg", frames[i % len(frames)], content_type="image/jpeg")
+        response = await client.post("/detect-emotion/", {"frame": frame})
+        return response.status_code, None
+
+    async def trend(client, i):
+        response = await client.get(f"/trend/{session_id}/data/")
+        return response.status_code, None
+
+    async def trend_page(client, i):
+        response = await client.get(f"/trend/{session_id}/page/")
+        return response.status_code, None
+
+    return {"chat": chat, "chat_stream": chat_stream, "detect_emotion": detect_emotion,
+            "trend": trend, "trend_page": trend_page}[endpoint]
+
+
+async def _drive(call, clients, requests, warmup):
+    for i in range(warmup):
+        await call(clients[i % len(clients)], i)
+
+    latencies, first_token, statuses = [], [], Counter()
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status, first = await call(client, i)
+            except Exception as e:
+                status, first = type(e).__name__, None
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] += 1
+            if first is not None:
+                first_token.append(first)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return latencies, first_token, statuses, time.perf_counter() - start
+
+
+def _run_worker(args):
+    """子进程：对一个接口施压，最后一行输出 JSON 结果"""
+    _setup_django(args.db)
+    from django.contrib.auth import get_user_model
+    from django.test import AsyncClient
+
+    from benchmarks.common import percentile
+    from benchmarks.frames import synthetic_jpegs
+
+    frames = synthetic_jpegs(args.frames, args.width, args.height) if args.worker == "detect_emotion" else []
+    call = _request_factory(args.worker, args.session_id, frames)
+
+    async def main():
+        user = await get_user_model().objects.aget(id=args.user_id)
+        clients = []
+        for _ in range(args.concurrency):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+        baseline_rss = _peak_rss_mb()
+        latencies, first_token, statuses, elapsed = await _drive(call, clients, args.requests, args.warmup)
+        return baseline_rss, latencies, first_token, statuses, elapsed
+
+    baseline_rss, latencies, first_token, statuses, elapsed = asyncio.run(main())
+    row = summarize(latencies, elapsed)
+    if first_token:
+        row["first_token_p50_ms"] = round(percentile(first_token, 50) * 1000, 2)
+        row["first_token_p95_ms"] = round(percentile(first_token, 95) * 1000, 2)
+    row["errors"] = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    row["status"] = dict(statuses)
+    row["setup_rss_mb"] = baseline_rss
+    row["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(row))
+
+
+def _child(argv, env):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_endpoints", *argv], cwd=PROJECT_ROOT, env=env,
+                         capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(f"benchmark child failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    deltas = {}
+    for name, row in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        delta = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb"):
+            if old.get(key):
+                delta[key] = f"{(row[key] - old[key]) / old[key] * 100:+.1f}%"
+        deltas[name] = delta
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="每个接口的请求数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed-turns", type=int, default=500, help="会话里预先写入的对话轮数")
+    parser.add_argument("--frames", type=int, default=30, help="循环使用的合成帧数量")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub 首字节前的延迟")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--token-ms", type=float, default=15, help="stub 流式输出每块之间的间隔")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前 --json 保存的结果对比")
+    # 子进程参数
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--user-id", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--session-id", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == "prepare":
+        print(json.dumps(_prepare(args.db, args.seed_turns)))
+        return
+    if args.worker:
+        _run_worker(args)
+        return
+
+    from benchmarks.llm_stub import start_stub
+
+    stub, base_url = start_stub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, token_ms=args.token_ms)
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    env.update({"LLM_BASE_URL": base_url, "OPENROUTER_API_KEY": "bench-stub"})
+    env.setdefault("THROTTLE_ENABLED", "False")
+
+    workdir = tempfile.mkdtemp(prefix="bench-endpoints-")
+    seed_db = os.path.join(workdir, "seed.sqlite3")
+    results = {}
+    try:
+        ids = _child(["--worker", "prepare", "--db", seed_db, "--seed-turns", str(args.seed_turns)], env)
+        for endpoint in args.endpoints.split(","):
+            db = os.path.join(workdir, f"{endpoint}.sqlite3")
+            shutil.copyfile(seed_db, db)
+            results[endpoint] = _child([
+                "--worker", endpoint, "--db", db,
+                "--user-id", str(ids["user_id"]), "--session-id", str(ids["session_id"]),
+                "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                "--warmup", str(args.warmup), "--frames", str(args.frames),
+                "--width", str(args.width), "--height", str(args.height),
+            ], env)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    params = {k: v for k, v in vars(args).items() if k not in ("worker", "db", "user_id", "session_id")}
+    if args.baseline:
+        print("\nvs baseline:")
+        print_table(_compare(results, args.baseline))
+    if args.json:
+        write_json(args.json, "endpoints", params, results)
+
+
+if __name__ == "__main__":
+    main()
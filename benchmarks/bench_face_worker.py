@@ -0,0 +1,105 @@
+"""
+对比表情识别的两种部署方式：
+- inprocess：当前做法，每个请求线程直接调用共享的 FER().detect_emotions，一次一帧
+- worker：独立推理进程 + 跨请求微批次（chat.face_worker）
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_face_worker --frames 400 --concurrency 8 --assume-face --json face.json
+
+合成帧不一定能被人脸检测器识别，--assume-face 直接把整帧当作人脸框，保证分类模型被调用。
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+
+from benchmarks.common import print_table, summarize, write_json
+from benchmarks.frames import synthetic_bgr
+
+AUTHKEY = b"bench-face-worker"
+
+
+def _drive(call, frames, concurrency, face_rects):
+    latencies = []
+    lock = threading.Lock()
+    cursor = iter(range(len(frames)))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(cursor, None)
+            if index is None:
+                return
+            start = time.perf_counter()
+            call(frames[index], face_rects)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _serve(address, max_batch, max_wait):
+    from chat.face_worker import InferenceServer
+    InferenceServer(address, AUTHKEY, max_batch=max_batch, max_wait=max_wait).serve_forever()
+
+
+def _wait_for_worker(client, frame, face_rects, timeout=120):
+    # 模型加载需要时间，先跑通一帧再开始计时
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return client.detect_emotions(frame, face_rects)
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--address", default="127.0.0.1:6011")
+    parser.add_argument("--assume-face", action="store_true")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    frames = [synthetic_bgr(args.width, args.height, seed) for seed in range(args.frames)]
+    face_rects = [(0, 0, args.width, args.height)] if args.assume_face else None
+    results = {}
+
+    from fer import FER
+    detector = FER()
+    detector.detect_emotions(frames[0], face_rects)  # 预热
+    results["inprocess"] = _drive(lambda f, r: detector.detect_emotions(f, r),
+                                  frames, args.concurrency, face_rects)
+
+    from chat.face_client import FaceWorkerClient
+    server = multiprocessing.Process(target=_serve, daemon=True,
+                                     args=(args.address, args.max_batch, args.max_wait_ms / 1000))
+    server.start()
+    try:
+        client = FaceWorkerClient(args.address, AUTHKEY, timeout=30)
+        _wait_for_worker(client, frames[0], face_rects)
+        results["worker"] = _drive(client.detect_emotions, frames, args.concurrency, face_rects)
+    finally:
+        server.terminate()
+
+    print_table(results)
+    if args.json:
+        write_json(args.json, "face_worker", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+对比消息语言识别的做法：
+- langdetect：原来的写法，每条消息直接 langdetect.detect（未固定 seed）
+- script：chat.language.detect，先按字符区段判断，判断不出来再用固定 seed 的 langdetect
+- script_session：同上，带客户端缓存（每条消息各算一个客户端，重复发送）
+
+输出每次调用的耗时（微秒）、与“是否中文”标注的一致率，以及同一句话重复识别结果不一致的句子数。
+首次调用 langdetect 会加载语言 profile，计时前先各调用一次预热。
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_language --rounds 200 --json language.json
+"""
+import argparse
+import time
+
+from benchmarks.common import percentile, print_table, write_json
+
+# (消息, 是否中文)
+MESSAGES = [
+    ("I don't really know how I feel about the interview tomorrow.", False),
+    ("ok", False),
+    ("lol", False),
+    ("today was fine I guess", False),
+    ("今天加班到很晚，回家路上一直在想工作的事。", True),
+    ("好累", True),
+    ("我 today 真的 very tired", True),
+    ("周末本来想出去走走，结果下了一整天的雨。", True),
+    ("Estoy un poco cansada, pero está bien.", False),
+    ("Je suis très fatigué aujourd'hui.", False),
+    ("Мне сегодня грустно.", False),
+    ("今日はとても疲れました。", False),
+    ("오늘 너무 피곤해요", False),
+    ("😢😢", False),
+    ("123", False),
+]
+
+
+def _measure(detect, rounds, session=False):
+    latencies, correct, outputs = [], 0, {}
+    for _ in range(rounds):
+        for index, (text, is_zh) in enumerate(MESSAGES):
+            start = time.perf_counter()
+            language = detect(text, index) if session else detect(text)
+            latencies.append(time.perf_counter() - start)
+            correct += language.startswith("zh") == is_zh
+            outputs.setdefault(index, set()).add(language)
+    return {
+        "calls": len(latencies),
+        "p50_us": round(percentile(latencies, 50) * 1e6, 2),
+        "p95_us": round(percentile(latencies, 95) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 2),
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 2),
+        "zh_accuracy": round(correct / len(latencies), 4),
+        "unstable_messages": sum(len(values) > 1 for values in outputs.values()),
+    }
+
+
+def _langdetect(text):
+    # 与原来 views.detect_language 相同
+    from langdetect import detect
+    try:
+        return detect(text)
+    except Exception:
+        return "en"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=100, help="每条消息识别的次数")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    # chat.language 会固定 langdetect 的全局 seed，原来的写法要先测
+    _langdetect("warm up")
+    results = {"langdetect": _measure(_langdetect, args.rounds)}
+
+    from chat import language
+
+    language.detect("warm up é")
+    results["script"] = _measure(language.detect, args.rounds)
+    results["script_session"] = _measure(language.detect, args.rounds, session=True)
+    print_table(results)
+    if args.json:
+        write_json(args.json, "language", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
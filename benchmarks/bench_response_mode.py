@@ -0,0 +1,134 @@
+"""
+对比聊天接口的两种 LLM 调用方式（CHAT_RESPONSE_MODE）：
+- separate：情绪分类与回复两次请求并发（延迟取两者中较慢的，token 相加）
+- combined：一次请求返回 {"emotion", "reason", "reply"}；输出不合法时按线上逻辑补发 separate，两部分都计入
+
+请求发往 LLM_BASE_URL（默认 OpenRouter，需要 OPENROUTER_API_KEY；也可以指向 benchmarks.llm_stub）。
+token 优先取响应里的 usage，没有时用 gpt_helper.estimate_tokens 估算。本地分类器与缓存不参与，每条消息都走 LLM。
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_response_mode --messages 20 --json modes.json
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import django
+
+from benchmarks.common import print_table, summarize, write_json
+
+MESSAGES = [
+    "I don't really know how I feel about the interview tomorrow.",
+    "My sister finally called me after two months.",
+    "今天加班到很晚，回家路上一直在想工作的事。",
+    "I keep replaying that conversation in my head.",
+    "周末本来想出去走走，结果下了一整天的雨。",
+    "The new apartment is quiet, maybe too quiet.",
+    "我不知道该不该告诉朋友这件事。",
+    "Work was okay I guess, nothing special happened.",
+]
+HISTORY = [
+    {"user": "Hi, I feel a bit off today.", "bot": "I'm here with you. Want to tell me what's going on?"},
+    {"user": "Just tired, I think.", "bot": "That makes sense. Have you been sleeping alright lately?"},
+]
+
+
+def _usage(result, messages):
+    usage = result.get("usage") or {}
+    if usage.get("prompt_tokens") is not None:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), "usage"
+    from chat.gpt_helper import estimate_tokens
+
+    content = result["choices"][0]["message"]["content"] or ""
+    return sum(estimate_tokens(m["content"]) for m in messages), estimate_tokens(content), "estimate"
+
+
+async def _separate(text, style):
+    from chat import gpt_helper, llm_client, views
+
+    emotion_payload = views._text_emotion_payload(text)
+    reply_payload = gpt_helper._reply_payload(gpt_helper.build_messages(text, style, HISTORY))
+    emotion, reply = await asyncio.gather(
+        llm_client.achat_completion(emotion_payload, read_timeout=views.TEXT_EMOTION_READ_TIMEOUT),
+        llm_client.achat_completion(reply_payload),
+    )
+    usages = [_usage(emotion, emotion_payload["messages"]), _usage(reply, reply_payload["messages"])]
+    return usages, False
+
+
+async def _combined(text, style):
+    from chat import gpt_helper, llm_client
+
+    payload = gpt_helper._reply_payload(gpt_helper.build_combined_messages(text, style, HISTORY))
+    result = await llm_client.achat_completion(payload)
+    usages = [_usage(result, payload["messages"])]
+    if gpt_helper.parse_combined(result["choices"][0]["message"]["content"]) is not None:
+        return usages, False
+    fallback, _ = await _separate(text, style)
+    return usages + fallback, True
+
+
+async def _run(mode, count, concurrency, style):
+    call = _combined if mode == "combined" else _separate
+    latencies, prompt, completion, fallbacks, errors = [], 0, 0, 0, 0
+    sources = set()
+    queue = asyncio.Queue()
+    for i in range(count):
+        queue.put_nowait(MESSAGES[i % len(MESSAGES)])
+
+    async def worker():
+        nonlocal prompt, completion, fallbacks, errors
+        while not queue.empty():
+            text = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                usages, fell_back = await call(text, style)
+            except Exception as e:
+                errors += 1
+                print(f"{mode}: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            fallbacks += fell_back
+            for p, c, source in usages:
+                prompt += p
+                completion += c
+                sources.add(source)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    row = summarize(latencies, time.perf_counter() - start)
+    done = len(latencies) or 1
+    row.update({
+        "prompt_tokens_per_msg": round(prompt / done, 1),
+        "completion_tokens_per_msg": round(completion / done, 1),
+        "fallbacks": fallbacks,
+        "errors": errors,
+        "tokens": "/".join(sorted(sources)) or "-",
+    })
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--style", default="friend")
+    parser.add_argument("--modes", default="separate,combined")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    django.setup()
+
+    results = {}
+    for mode in args.modes.split(","):
+        results[mode] = asyncio.run(_run(mode, args.messages, args.concurrency, args.style))
+
+    print_table(results)
+    if args.json:
+        write_json(args.json, "response_mode", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+测量进程启动成本：django.setup() + 加载全部 URL（会导入 chat.views）的耗时与峰值 RSS，
+并记录 cv2 / fer / tensorflow 等重依赖是否被导入。每次都在全新的子进程里测。
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_startup --runs 5 --json startup.json
+    CAMERA_INFERENCE_ENABLED=False python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.common import print_table, write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_done = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024
+heavy = ["cv2", "numpy", "PIL", "fer", "tensorflow", "keras", "torch", "textblob", "nltk"]
+print(json.dumps({
+    "setup_ms": (setup_done - start) * 1000,
+    "urls_ms": (urls_done - setup_done) * 1000,
+    "total_ms": (urls_done - start) * 1000,
+    "peak_rss_mb": rss_kb / 1024,
+    "modules": len(sys.modules),
+    "heavy_imported": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+def probe_once():
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    samples = [probe_once() for _ in range(args.runs)]
+    result = {
+        key: round(statistics.median(s[key] for s in samples), 2)
+        for key in ("setup_ms", "urls_ms", "total_ms", "peak_rss_mb", "modules")
+    }
+    result["heavy_imported"] = ",".join(samples[-1]["heavy_imported"]) or "-"
+    results = {"startup(median)": result}
+
+    print_table(results)
+    if args.json:
+        write_json(args.json, "startup", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
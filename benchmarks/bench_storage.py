@@ -0,0 +1,133 @@
+"""
+对比 ChatLog / EmotionLog 新旧存储布局（临时 SQLite 库，跑完即删）：
+- before：迁移到 0004，按旧写法每轮两次独立提交的 acreate（EmotionLog 重复保存消息原文，情绪存字符串）
+- after：执行 0005 迁移转换同一批数据后统计表大小，再按新写法 save_turn 写入一批测速
+  （单事务，情绪存小整数，EmotionLog 引用 ChatLog）
+
+表大小取 VACUUM 后 dbstat 统计的表 + 索引字节数。默认断开汇总表/统计信号，只比较存储本身。
+
+用法（在项目根目录）：
+    python -m benchmarks.bench_storage --turns 5000 --json storage.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import django
+from django.conf import settings
+
+from benchmarks.common import print_table, write_json
+
+EMOTIONS = ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]
+WORDS = ("today work tired happy friend coffee rain sleep exam weekend music walk lonely "
+         "dinner project deadline family movie game sunshine").split()
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _turns(count, seed=0):
+    rng = random.Random(seed)
+    return [(_sentence(rng, 12), _sentence(rng, 50), rng.choice(EMOTIONS), rng.choice(EMOTIONS))
+            for _ in range(count)]
+
+
+def _table_bytes(connection, tables):
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+        cursor.execute(
+            "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+            f"WHERE m.tbl_name IN ({','.join('%s' for _ in tables)}) GROUP BY m.tbl_name", tables)
+        return dict(cursor.fetchall())
+
+
+def _measure(connection, rows, elapsed):
+    sizes = _table_bytes(connection, ["chat_chatlog", "chat_emotionlog"])
+    total = sum(sizes.values())
+    return {
+        "turns_per_s": round(rows / elapsed, 1),
+        "chatlog_kb": round(sizes.get("chat_chatlog", 0) / 1024, 1),
+        "emotionlog_kb": round(sizes.get("chat_emotionlog", 0) / 1024, 1),
+        "bytes_per_turn": round(total / rows, 1),
+    }
+
+
+async def _insert_before(ChatSession, ChatLog, EmotionLog, turns):
+    session = await ChatSession.objects.acreate()
+    start = time.perf_counter()
+    for message, response, camera, text in turns:
+        await ChatLog.objects.acreate(session=session, user_message=message, camera_emotion=camera,
+                                      text_emotion=text, gpt_response=response)
+        await EmotionLog.objects.acreate(session=session, user_message=message, camera_emotion=camera,
+                                         text_emotion=text)
+    return time.perf_counter() - start
+
+
+async def _insert_after(turns):
+    from chat.models import ChatSession
+    from chat.views import save_turn
+
+    session = await ChatSession.objects.acreate()
+    start = time.perf_counter()
+    for message, response, camera, text in turns:
+        await save_turn(session, message, camera, text, response)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--with-signals", action="store_true", help="新写法计入汇总表/统计信号的开销")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
+    settings.DATABASES["default"]["NAME"] = path
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from django.db.models.signals import post_save
+
+    from chat.models import EmotionLog
+
+    if not args.with_signals:
+        for uid in ("chat.emotion_rollup", "chat.emotion_stats"):
+            post_save.disconnect(sender=EmotionLog, dispatch_uid=uid)
+
+    try:
+        turns = _turns(args.turns)
+        results = {}
+
+        call_command("migrate", "chat", "0004", verbosity=0)
+        old = MigrationExecutor(connection).loader.project_state(("chat", "0004_emotion_stats")).apps
+        elapsed = asyncio.run(_insert_before(old.get_model("chat", "ChatSession"), old.get_model("chat", "ChatLog"),
+                                             old.get_model("chat", "EmotionLog"), turns))
+        results["before"] = _measure(connection, len(turns), elapsed)
+
+        # 表大小取迁移转换后的同一批数据，写入速度取新写法再写一批
+        start = time.perf_counter()
+        call_command("migrate", "chat", verbosity=0)
+        migrate_s = time.perf_counter() - start
+        after = _measure(connection, len(turns), 1.0)
+        elapsed = asyncio.run(_insert_after(turns))
+        after["turns_per_s"] = round(len(turns) / elapsed, 1)
+        after["migrate_s"] = round(migrate_s, 2)
+        results["after"] = after
+    finally:
+        os.remove(path)
+
+    print_table(results)
+    if args.json:
+        write_json(args.json, "storage", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
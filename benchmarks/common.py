@@ -0,0 +1,41 @@
+"""压测脚本共用的统计与输出工具"""
+import json
+import platform
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """latencies 为秒，输出毫秒"""
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def print_table(results):
+    for name, row in results.items():
+        cells = "  ".join(f"{key}={value}" for key, value in row.items())
+        print(f"{name:<28} {cells}")
+
+
+def write_json(path, benchmark, params, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "benchmark": benchmark,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "params": params,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,39 @@
+"""生成合成的摄像头帧（带一张简笔人脸 + 噪声），用于离线压测"""
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_frame(width=640, height=480, seed=0, mode="RGB"):
+    """返回 PIL.Image；mode 可为 RGB / RGBA / L，用来覆盖不同上传格式"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(90, 140, size=(height, width, 3), dtype=np.uint8)
+    img = Image.fromarray(base, "RGB")
+    draw = ImageDraw.Draw(img)
+
+    # 人脸位置随 seed 轻微抖动，模拟连续帧
+    cx = width // 2 + int(rng.integers(-10, 11))
+    cy = height // 2 + int(rng.integers(-10, 11))
+    r = min(width, height) // 4
+    draw.ellipse((cx - r, cy - int(r * 1.25), cx + r, cy + int(r * 1.25)), fill=(224, 186, 160))
+    for dx in (-r // 2.5, r // 2.5):
+        draw.ellipse((cx + dx - r // 8, cy - r // 3 - r // 12, cx + dx + r // 8, cy - r // 3 + r // 12),
+                     fill=(40, 30, 30))
+    draw.arc((cx - r // 2, cy + r // 4, cx + r // 2, cy + r // 1.4), 20, 160, fill=(120, 40, 40), width=4)
+    return img.convert(mode)
+
+
+def synthetic_jpeg(width=640, height=480, seed=0, quality=85):
+    buf = io.BytesIO()
+    synthetic_frame(width, height, seed).save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def synthetic_jpegs(count, width=640, height=480):
+    return [synthetic_jpeg(width, height, seed) for seed in range(count)]
+
+
+def synthetic_bgr(width=640, height=480, seed=0):
+    """OpenCV 使用的 BGR ndarray"""
+    return np.ascontiguousarray(np.asarray(synthetic_frame(width, height, seed))[:, :, ::-1])
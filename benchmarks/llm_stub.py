@@ -0,0 +1,136 @@
+"""
+本地的 OpenRouter chat/completions stub，压测时代替真实 API（LLM_BASE_URL 指向它即可）。
+
+按请求内容返回对应格式：情绪分类 → {"emotion","reason"}；合并模式 → {"emotion","reason","reply"}；
+对话摘要 → 一段摘要；其余 → 普通回复。stream: true 时按 SSE 分块输出，每块间隔 --token-ms。
+响应带 usage，便于统计 token。
+
+用法（在项目根目录）：
+    python -m benchmarks.llm_stub --port 8089 --latency-ms 300 --token-ms 15
+    LLM_BASE_URL=http://127.0.0.1:8089 python manage.py runserver
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("That sounds like a lot to carry. I'm here with you, and we can take it one step at a time. "
+         "What part of it feels the heaviest right now?")
+SUMMARY = "The user has been feeling tired and worried about work; the companion offered to keep checking in."
+EMOTIONS = ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]
+
+
+def _content(messages, rng):
+    system = " ".join(m["content"] for m in messages if m["role"] == "system")
+    emotion = rng.choice(EMOTIONS)
+    if "情绪分析" in system:
+        return json.dumps({"emotion": emotion, "reason": "stub"})
+    if "Respond ONLY with a JSON object" in " ".join(m["content"] for m in messages):
+        return json.dumps({"emotion": emotion, "reason": "stub", "reply": REPLY})
+    if "short memory of a supportive conversation" in system:
+        return SUMMARY
+    return REPLY
+
+
+def _chunks(text, size=12):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 由 make_server 设置
+    latency = 0.3
+    jitter = 0.0
+    token_delay = 0.015
+    error_rate = 0.0
+    rng = random.Random(0)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = body.get("messages", [])
+        time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        if self.rng.random() < self.error_rate:
+            self._send(503, "application/json", b'{"error": "stub overloaded"}')
+            return
+
+        content = _content(messages, self.rng)
+        usage = {"prompt_tokens": sum(len(m["content"]) for m in messages) // 4,
+                 "completion_tokens": len(content) // 4}
+        if body.get("stream"):
+            self._stream(content)
+        else:
+            payload = {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage}
+            self._send(200, "application/json", json.dumps(payload).encode())
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"choices": [{"delta": {"content": piece}}]} for piece in _chunks(content)]
+        for index, event in enumerate(events):
+            if index:
+                time.sleep(self.token_delay)
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=300, jitter_ms=0, token_ms=15, error_rate=0.0, seed=0):
+    handler = type("Handler", (StubHandler,), {
+        "latency": latency_ms / 1000,
+        "jitter": jitter_ms / 1000,
+        "token_delay": token_ms / 1000,
+        "error_rate": error_rate,
+        "rng": random.Random(seed),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub(**options):
+    """后台线程启动 stub，返回 (server, base_url)；port=0 时随机端口"""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300, help="首字节前的延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--token-ms", type=float, default=15, help="流式输出每块之间的间隔")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="按比例返回 503")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.token_ms, args.error_rate)
+    print(f"LLM stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+进程内的准入控制：限制同时进行的 LLM 请求与表情推理数量，超出时排队，队列过长或等待超时直接拒绝（503），
+过载时尾延迟有上限，而不是让所有请求一起变慢。
+
+    with admission.inference_gate().slot():          # 同步
+        ...
+    async with admission.llm_gate().aslot():         # 异步
+        ...
+
+同一个 Gate 可以同时被线程和事件循环使用：释放时把名额直接交给排在最前面的等待者。
+"""
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+
+class Overloaded(Exception):
+    """队列已满或排队超时"""
+
+    def __init__(self, gate, retry_after=1):
+        super().__init__(f"{gate} is overloaded")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.granted = False
+        self.event = event
+        self.loop = loop
+        self.future = future
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Gate:
+    def __init__(self, name, limit, max_queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.shed = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_enter(self, waiter):
+        """拿到名额返回 True；需要排队时把 waiter 放进队列返回 False；队列满时抛 Overloaded"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(self.name)
+            self._waiters.append(waiter)
+            return False
+
+    def _give_up(self, waiter):
+        """等待者放弃；若名额已经交给它，返回 True（调用方仍需 release）"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.shed += 1
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True  # 名额直接转交，in_flight 不变
+            else:
+                self.in_flight -= 1
+                return
+        waiter.wake()
+
+    def acquire(self):
+        waiter = _Waiter(event=threading.Event())
+        if self._try_enter(waiter):
+            return
+        if not waiter.event.wait(self.timeout) and not self._give_up(waiter):
+            raise Overloaded(self.name)
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop=loop, future=loop.create_future())
+        if self._try_enter(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                raise Overloaded(self.name) from None
+        except BaseException:
+            # 请求被取消（客户端断开）：已经拿到的名额要还回去
+            if self._give_up(waiter):
+                self.release()
+            raise
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def saturated(self):
+        """排队已满，新的请求一定会被拒绝（可在开始处理前快速返回 503）"""
+        with self._lock:
+            return self.in_flight >= self.limit and len(self._waiters) >= self.max_queue
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self.in_flight, "queued": len(self._waiters), "shed": self.shed}
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def _gate(name, limit, max_queue, timeout):
+    gate = _gates.get(name)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.get(name)
+            if gate is None:
+                gate = _gates[name] = Gate(name, limit, max_queue, timeout)
+    return gate
+
+
+def llm_gate():
+    return _gate("llm", settings.LLM_MAX_IN_FLIGHT, settings.LLM_MAX_QUEUE, settings.LLM_QUEUE_TIMEOUT)
+
+
+def inference_gate():
+    return _gate("inference", settings.INFERENCE_MAX_IN_FLIGHT, settings.INFERENCE_MAX_QUEUE,
+                 settings.INFERENCE_QUEUE_TIMEOUT)
+
+
+def stats():
+    return {name: gate.stats() for name, gate in _gates.items()}
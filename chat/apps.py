@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chat"
+
+    def ready(self):
+        from . import signals  # noqa: F401  注册 EmotionLog → 汇总表的信号
+
+        # ✅ 需要时在启动阶段加载表情模型，避免第一个摄像头请求承担加载时间
+        if settings.VISION_WARMUP:
+            from . import vision
+            vision.warm_up()
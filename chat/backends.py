@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """
+    authenticate(request, email=..., password=...)：按邮箱一次查询取到用户（走 unique_user_email 索引）。
+    不传 email 时交给后面的 ModelBackend（如后台按用户名登录）。
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        try:
+            # exclude 与唯一索引的条件一致，SQLite 才会用上这个部分索引
+            user = UserModel._default_manager.exclude(email="").get(email=email)
+        except UserModel.DoesNotExist:
+            # 与用户存在时一样跑一次密码哈希，避免从响应时间判断邮箱是否注册过
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
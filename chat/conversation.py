@@ -0,0 +1,204 @@
+"""
+每个会话的滚动上下文：最近若干轮原文 + 更早对话的摘要。
+
+- 每轮对话结束后 append()，下一轮直接从内存/缓存取，不再查询 ChatLog
+- 原文超过 CONVERSATION_WINDOW_TURNS 轮时，由后台线程把较早的轮次连同旧摘要压缩成新摘要，
+  只保留最近 CONVERSATION_KEEP_TURNS 轮原文；摘要请求失败时原文最多保留两倍窗口，超出丢弃最早的
+- 缓存里没有某个会话时（进程重启、被淘汰）从 ChatLog 读最近一个窗口补上，摘要从空开始
+
+- CONVERSATION_BACKEND = "cache"：存到 CONVERSATION_CACHE_ALIAS 指定的 Django cache，多 worker 共享（默认）
+- CONVERSATION_BACKEND = "memory"：进程内，只适合单 worker 部署
+"""
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import gpt_helper
+from .models import ChatLog
+
+log = logging.getLogger(__name__)
+
+
+def _new_window():
+    return {"summary": "", "turns": [], "next_seq": 0, "summarized_upto": -1}
+
+
+def _append_turn(window, user, bot, max_turns):
+    window["turns"].append({"seq": window["next_seq"], "user": user, "bot": bot})
+    window["next_seq"] += 1
+    del window["turns"][:-max_turns]
+
+
+class MemoryConversationStore:
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return None
+            self._windows.move_to_end(key)
+            return copy.deepcopy(window)
+
+    def update(self, key, fn, default=None):
+        """在锁内修改窗口；不存在时以 default（或空窗口）为起点"""
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = default if default is not None else _new_window()
+                while len(self._windows) > self.max_sessions:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(key)
+            fn(window)
+            return copy.deepcopy(window)
+
+    # 只在内存里操作，事件循环上直接调用同步版本
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aupdate(self, key, fn, default=None):
+        return self.update(key, fn, default)
+
+
+class CacheConversationStore:
+    """整个窗口存一个 cache key；同一会话并发写入时以后写为准"""
+
+    def __init__(self, alias, timeout=7 * 24 * 3600):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key):
+        return caches[self.alias].get(f"conversation:{key}")
+
+    def update(self, key, fn, default=None):
+        window = self.get(key)
+        if window is None:
+            window = default if default is not None else _new_window()
+        fn(window)
+        caches[self.alias].set(f"conversation:{key}", window, self.timeout)
+        return window
+
+    async def aget(self, key):
+        return await caches[self.alias].aget(f"conversation:{key}")
+
+    async def aupdate(self, key, fn, default=None):
+        window = await self.aget(key)
+        if window is None:
+            window = default if default is not None else _new_window()
+        fn(window)
+        await caches[self.alias].aset(f"conversation:{key}", window, self.timeout)
+        return window
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.CONVERSATION_BACKEND == "memory":
+                    _store = MemoryConversationStore()
+                else:
+                    _store = CacheConversationStore(settings.CONVERSATION_CACHE_ALIAS)
+    return _store
+
+
+def _seed_window(turns):
+    window = _new_window()
+    for user, bot in turns:
+        _append_turn(window, user, bot, settings.CONVERSATION_WINDOW_TURNS * 2)
+    return window
+
+
+async def aget_window(session_id):
+    """
+    返回 {"summary": str, "turns": [{"user", "bot", "seq"}...]}（副本）。
+    只有缓存里没有这个会话时才查一次 ChatLog。
+    """
+    store = get_store()
+    window = await store.aget(session_id)
+    if window is None:
+        logs = (ChatLog.objects.filter(session_id=session_id).order_by("-created_at", "-id")
+                .values_list("user_message", "gpt_response")[:settings.CONVERSATION_WINDOW_TURNS])
+        seed = _seed_window([row async for row in logs][::-1])
+        # 查询期间别的请求可能已经建好了窗口，以已有的为准
+        window = await store.aupdate(session_id, lambda w: None, default=seed)
+    return window
+
+
+def append(session_id, user, bot):
+    """记录一轮对话；原文超出窗口时安排后台摘要"""
+    window = get_store().update(
+        session_id, lambda w: _append_turn(w, user, bot, settings.CONVERSATION_WINDOW_TURNS * 2))
+    if len(window["turns"]) > settings.CONVERSATION_WINDOW_TURNS:
+        schedule_summary(session_id)
+
+
+async def aappend(session_id, user, bot):
+    """append 的异步版本，异步视图使用"""
+    window = await get_store().aupdate(
+        session_id, lambda w: _append_turn(w, user, bot, settings.CONVERSATION_WINDOW_TURNS * 2))
+    if len(window["turns"]) > settings.CONVERSATION_WINDOW_TURNS:
+        schedule_summary(session_id)
+
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _pending_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.CONVERSATION_SUMMARY_WORKERS,
+                                           thread_name_prefix="conversation-summary")
+    return _executor
+
+
+def schedule_summary(session_id):
+    """同一会话同时只排一个摘要任务"""
+    with _pending_lock:
+        if session_id in _pending:
+            return None
+        _pending.add(session_id)
+    return _get_executor().submit(_summarize, session_id)
+
+
+def _summarize(session_id):
+    try:
+        store = get_store()
+        window = store.get(session_id)
+        keep = settings.CONVERSATION_KEEP_TURNS
+        if window is None or len(window["turns"]) <= keep:
+            return
+        folded = window["turns"][:-keep] if keep else window["turns"]
+        upto = folded[-1]["seq"]
+        summary = gpt_helper.summarize_conversation(window["summary"], folded)
+
+        def apply(w):
+            # 摘要期间新增的轮次保留；已被更新的摘要覆盖过的不再重复处理
+            if w["summarized_upto"] >= upto:
+                return
+            w["turns"] = [t for t in w["turns"] if t["seq"] > upto]
+            w["summary"] = summary
+            w["summarized_upto"] = upto
+
+        store.update(session_id, apply)
+    except Exception:
+        log.exception("conversation summary failed", extra={"session_id": session_id})
+    finally:
+        with _pending_lock:
+            _pending.discard(session_id)
@@ -0,0 +1,158 @@
+"""
+文字情绪分类结果缓存：key 为归一化后的消息文本，value 为 (emotion, reason)。
+
+- 第一层：进程内 LRU，按容量和 TTL 淘汰
+- 第二层（可选）：Django cache（settings.TEXT_EMOTION_CACHE_ALIAS），多个 gunicorn worker 共享命中
+- stats() 返回命中/未命中计数
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = None
+_local_lock = threading.Lock()
+_stats = {"hits": 0, "shared_hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _local_cache():
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = TTLCache(getattr(settings, "TEXT_EMOTION_CACHE_SIZE", 5000),
+                                  getattr(settings, "TEXT_EMOTION_CACHE_TTL", 86400))
+    return _local
+
+
+def _shared_cache():
+    alias = getattr(settings, "TEXT_EMOTION_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize(text):
+    """全角转半角、小写、合并空白，"OK " 与 "ok" 视为同一条"""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _shared_key(key):
+    return "text_emotion:" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def lookup(text):
+    key = normalize(text)
+    value = _local_cache().get(key)
+    if value is not None:
+        _count("hits")
+        return value
+    shared = _shared_cache()
+    if shared is not None:
+        value = shared.get(_shared_key(key))
+        if value is not None:
+            value = tuple(value)
+            _local_cache().set(key, value)
+            _count("shared_hits")
+            return value
+    _count("misses")
+    return None
+
+
+def store(text, value):
+    key = normalize(text)
+    _local_cache().set(key, tuple(value))
+    shared = _shared_cache()
+    if shared is not None:
+        shared.set(_shared_key(key), tuple(value), getattr(settings, "TEXT_EMOTION_CACHE_TTL", 86400))
+
+
+async def alookup(text):
+    key = normalize(text)
+    value = _local_cache().get(key)
+    if value is not None:
+        _count("hits")
+        return value
+    shared = _shared_cache()
+    if shared is not None:
+        value = await shared.aget(_shared_key(key))
+        if value is not None:
+            value = tuple(value)
+            _local_cache().set(key, value)
+            _count("shared_hits")
+            return value
+    _count("misses")
+    return None
+
+
+async def astore(text, value):
+    key = normalize(text)
+    _local_cache().set(key, tuple(value))
+    shared = _shared_cache()
+    if shared is not None:
+        await shared.aset(_shared_key(key), tuple(value), getattr(settings, "TEXT_EMOTION_CACHE_TTL", 86400))
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["shared_hits"] + result["misses"]
+    result["size"] = len(_local_cache())
+    result["hit_rate"] = (result["hits"] + result["shared_hits"]) / lookups if lookups else 0.0
+    return result
+
+
+def clear():
+    _local_cache().clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
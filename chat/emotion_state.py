@@ -0,0 +1,175 @@
+"""
+每个用户的情绪状态：最近的摄像头识别结果（环形缓冲）、连续负面计数、上次弹窗/关心时间。
+
+取代原来存在 request.session 里的 negative_count / last_alert_time / last_care_time，
+每帧不再触发一次数据库 session 写入。状态不持久化，缓存过期或清空后从零开始计数。
+
+- EMOTION_STATE_BACKEND = "cache"：存到 EMOTION_STATE_CACHE_ALIAS 指定的 Django cache，多 worker 共享（默认）
+- EMOTION_STATE_BACKEND = "memory"：进程内，只适合单 worker 部署；多 worker 时同一用户的帧分散到
+  各个进程，连续负面计数凑不满，提醒可能永远不会触发
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .throttle import client_ip
+
+NEGATIVE_EMOTIONS = {"sad", "angry", "fear", "disgust"}
+ALERT_AFTER_NEGATIVES = 3     # 连续 3 帧负面触发提醒
+ALERT_COOLDOWN = 180          # 3 分钟内不重复提醒
+CARE_COOLDOWN = 300           # 5 分钟内不重复询问
+
+
+def client_key(request):
+    """按登录用户区分客户端；未登录时退回到会话或 IP"""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return _anonymous_key(request)
+
+
+async def aclient_key(request):
+    user = await request.auser()
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return _anonymous_key(request)
+
+
+def _anonymous_key(request):
+    if request.session.session_key:
+        return f"session:{request.session.session_key}"
+    # 反向代理后面 REMOTE_ADDR 都是代理地址，与限流一样按 TRUSTED_PROXIES 取真实客户端 IP
+    return f"ip:{client_ip(request)}"
+
+
+def _new_state(history):
+    return {"recent": deque(maxlen=history), "negative_count": 0,
+            "last_alert_time": None, "last_care_time": None}
+
+
+def _apply_detection(state, emotion, now):
+    """更新计数并返回是否需要弹窗提醒，规则与原 session 版本一致"""
+    state["recent"].append((now, emotion))
+    if emotion in NEGATIVE_EMOTIONS:
+        state["negative_count"] += 1
+    else:
+        state["negative_count"] = 0
+
+    alert = False
+    if state["negative_count"] >= ALERT_AFTER_NEGATIVES:
+        last = state["last_alert_time"]
+        if last is None or now - last > ALERT_COOLDOWN:
+            alert = True
+            state["last_alert_time"] = now
+        state["negative_count"] = 0  # 重置计数（无论是否弹窗）
+    return alert
+
+
+def _apply_care(state, now):
+    last = state["last_care_time"]
+    if last is None or now - last > CARE_COOLDOWN:
+        state["last_care_time"] = now
+        return True
+    return False
+
+
+class MemoryEmotionStore:
+    def __init__(self, history=20, max_clients=10000):
+        self.history = history
+        self.max_clients = max_clients
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _new_state(self.history)
+            while len(self._states) > self.max_clients:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def record_detection(self, key, emotion):
+        with self._lock:
+            return _apply_detection(self._state(key), emotion, time.time())
+
+    def claim_care(self, key):
+        """需要关心时调用；距上次询问超过 5 分钟返回 True 并记下时间"""
+        with self._lock:
+            return _apply_care(self._state(key), time.time())
+
+    async def aclaim_care(self, key):
+        return self.claim_care(key)
+
+    def recent(self, key):
+        with self._lock:
+            return list(self._state(key)["recent"])
+
+
+class CacheEmotionStore:
+    """状态整体存一个 cache key；同一用户并发写入时以后写为准，计数偶有误差可以接受"""
+
+    def __init__(self, alias, history=20, timeout=3600):
+        self.alias = alias
+        self.history = history
+        self.timeout = timeout
+
+    def _restore(self, state):
+        if state is None:
+            return _new_state(self.history)
+        state["recent"] = deque(state["recent"], maxlen=self.history)
+        return state
+
+    def _dump(self, state):
+        return dict(state, recent=list(state["recent"]))
+
+    def _load(self, key):
+        return self._restore(caches[self.alias].get(f"emotion_state:{key}"))
+
+    def _save(self, key, state):
+        caches[self.alias].set(f"emotion_state:{key}", self._dump(state), self.timeout)
+
+    def record_detection(self, key, emotion):
+        state = self._load(key)
+        alert = _apply_detection(state, emotion, time.time())
+        self._save(key, state)
+        return alert
+
+    def claim_care(self, key):
+        state = self._load(key)
+        claimed = _apply_care(state, time.time())
+        if claimed:
+            self._save(key, state)
+        return claimed
+
+    async def aclaim_care(self, key):
+        """claim_care 的异步版本，异步视图使用"""
+        state = await caches[self.alias].aget(f"emotion_state:{key}")
+        state = self._restore(state)
+        claimed = _apply_care(state, time.time())
+        if claimed:
+            await caches[self.alias].aset(f"emotion_state:{key}", self._dump(state), self.timeout)
+        return claimed
+
+    def recent(self, key):
+        return list(self._load(key)["recent"])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                history = settings.EMOTION_STATE_HISTORY
+                if settings.EMOTION_STATE_BACKEND == "memory":
+                    _store = MemoryEmotionStore(history)
+                else:
+                    _store = CacheEmotionStore(settings.EMOTION_STATE_CACHE_ALIAS, history)
+    return _store
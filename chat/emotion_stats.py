@@ -0,0 +1,114 @@
+"""
+每个会话摄像头情绪得分的累计统计（EmotionStats），趋势页的建议等级直接读这一行。
+
+- 等权：Welford 在线算法维护 count / mean / m2，与对全部记录求 mean + statistics.stdev 结果一致
+- 近期加权：指数衰减均值/方差，每条新记录权重 EMOTION_STATS_ALPHA
+- 新写入的 EmotionLog 通过 post_save 信号用一条 UPDATE 累加（SET 右侧读到的都是旧值），
+  历史数据用 manage.py backfill_emotion_stats 补齐
+"""
+import math
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import EmotionLog, EmotionStats
+
+# 情绪 → 得分，越高越需要关心
+EMOTION_SCORES = {
+    "happy": 1,
+    "neutral": 2,
+    "surprise": 3,
+    "fear": 4,
+    "disgust": 4,
+    "sad": 5,
+    "angry": 5
+}
+
+
+class RunningStats:
+    """纯 Python 版本，逐条 add()，用于回填和对一组情绪临时计算"""
+
+    def __init__(self, alpha=None):
+        self.alpha = settings.EMOTION_STATS_ALPHA if alpha is None else alpha
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma_mean = 0.0
+        self.ewma_var = 0.0
+
+    def add(self, x):
+        self.count += 1
+        if self.count == 1:
+            self.mean = self.ewma_mean = float(x)
+            return
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+        diff = x - self.ewma_mean
+        self.ewma_mean += self.alpha * diff
+        self.ewma_var = (1 - self.alpha) * (self.ewma_var + self.alpha * diff * diff)
+
+
+def _initial_values(x):
+    return {"count": 1, "mean": float(x), "m2": 0.0, "ewma_mean": float(x), "ewma_var": 0.0}
+
+
+def record(session_id, emotion):
+    """计入一条摄像头情绪；不在 EMOTION_SCORES 里的标签忽略"""
+    x = EMOTION_SCORES.get(emotion)
+    if x is None:
+        return
+    x = float(x)
+    alpha = settings.EMOTION_STATS_ALPHA
+    delta = x - F("mean")
+    diff = x - F("ewma_mean")
+    rows = EmotionStats.objects.filter(session_id=session_id)
+    update = dict(
+        count=F("count") + 1,
+        mean=F("mean") + delta / (F("count") + 1),
+        m2=F("m2") + delta * (delta - delta / (F("count") + 1)),
+        ewma_mean=F("ewma_mean") + alpha * diff,
+        ewma_var=(1 - alpha) * (F("ewma_var") + alpha * diff * diff),
+    )
+    if rows.update(**update):
+        return
+    try:
+        with transaction.atomic():
+            EmotionStats.objects.create(session_id=session_id, **_initial_values(x))
+    except IntegrityError:
+        # 并发写入时别的请求已经建好了这一行
+        rows.update(**update)
+
+
+def backfill(session_id=None, alpha=None):
+    """按时间顺序重放 EmotionLog，重算各会话的统计，返回处理的会话数"""
+    logs = EmotionLog.objects.order_by("session_id", "timestamp", "id")
+    if session_id is not None:
+        logs = logs.filter(session_id=session_id)
+
+    per_session = {}
+    for sid, emotion in logs.values_list("session_id", "camera_emotion").iterator():
+        stats = per_session.setdefault(sid, RunningStats(alpha))
+        if emotion in EMOTION_SCORES:
+            stats.add(EMOTION_SCORES[emotion])
+
+    with transaction.atomic():
+        for sid, stats in per_session.items():
+            EmotionStats.objects.update_or_create(session_id=sid, defaults={
+                "count": stats.count, "mean": stats.mean, "m2": stats.m2,
+                "ewma_mean": stats.ewma_mean, "ewma_var": stats.ewma_var,
+            })
+    return len(per_session)
+
+
+def summarize(stats, weighting=None):
+    """EmotionStats / RunningStats → (count, 均值, 标准差)；weighting 为 all 或 recent"""
+    if stats is None or not stats.count:
+        return 0, 0.0, 0.0
+    weighting = weighting or settings.TREND_SUGGESTION_WEIGHTING
+    if weighting == "recent":
+        return stats.count, stats.ewma_mean, math.sqrt(max(stats.ewma_var, 0.0))
+    std_dev = math.sqrt(max(stats.m2, 0.0) / (stats.count - 1)) if stats.count > 1 else 0.0
+    return stats.count, stats.mean, std_dev
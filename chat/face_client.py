@@ -0,0 +1,110 @@
+"""
+face_worker 推理进程的客户端。每个线程持有一条长连接，按请求-响应方式同步调用。
+"""
+import ipaddress
+import itertools
+import threading
+from multiprocessing.connection import Client
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+MIN_AUTHKEY_LENGTH = 16
+
+
+def parse_address(address):
+    """"host:port" → (host, port)；其余视为 Unix socket 路径"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def is_local_address(address):
+    """parse_address 的结果是否为本机回环地址或 Unix socket"""
+    if isinstance(address, str):
+        return True
+    host = address[0].strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_authkey():
+    """settings.FACE_WORKER_AUTHKEY 的字节形式；未设置或太短时报错，不退回默认值"""
+    authkey = settings.FACE_WORKER_AUTHKEY
+    if len(authkey) < MIN_AUTHKEY_LENGTH:
+        raise ImproperlyConfigured(
+            f"FACE_WORKER_AUTHKEY must be set to a random string of at least {MIN_AUTHKEY_LENGTH} characters")
+    return authkey.encode()
+
+
+class FaceWorkerError(Exception):
+    """推理进程不可用、超时或推理失败"""
+
+
+class FaceWorkerClient:
+    def __init__(self, address, authkey, timeout=2.0):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ids = itertools.count()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except OSError as e:
+                raise FaceWorkerError(f"cannot connect to face worker: {e}") from e
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def detect_emotions(self, image, face_rectangles=None):
+        """与 FER.detect_emotions 返回格式相同"""
+        request_id = next(self._ids)
+        try:
+            conn = self._conn()
+            conn.send((request_id, image, face_rectangles))
+            if not conn.poll(self.timeout):
+                # 超时后这条连接上可能还会收到迟到的回复，直接丢弃连接
+                self._reset()
+                raise FaceWorkerError("face worker timed out")
+            reply_id, result, error = conn.recv()
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise FaceWorkerError(str(e)) from e
+
+        if reply_id != request_id:
+            self._reset()
+            raise FaceWorkerError("out-of-order reply from face worker")
+        if error:
+            raise FaceWorkerError(error)
+        return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """settings.FACE_WORKER_ADDRESS 未配置时返回 None，调用方走进程内推理"""
+    global _client
+    address = getattr(settings, "FACE_WORKER_ADDRESS", None)
+    if not address:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FaceWorkerClient(address, get_authkey(), settings.FACE_WORKER_TIMEOUT)
+    return _client
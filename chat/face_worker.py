@@ -0,0 +1,128 @@
+"""
+独立的表情识别推理进程：模型只加载一次，接收所有 web worker 发来的帧，攒成微批次后统一推理。
+
+- 每个客户端连接一个读线程，请求放进同一个队列
+- 批处理线程取到第一帧后，最多再等 max_wait 秒或凑满 max_batch 帧，然后一起推理
+- 人脸检测仍逐帧进行，所有帧里的人脸裁剪图合并成一个 batch 交给情绪分类模型
+
+启动：python manage.py run_face_worker
+"""
+import logging
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import numpy as np
+from fer import FER
+
+from .face_client import MIN_AUTHKEY_LENGTH, is_local_address, parse_address
+
+log = logging.getLogger(__name__)
+
+
+class BatchingFER(FER):
+    """支持多帧合并推理的 FER：借 _classify_emotions 钩子收集各帧的人脸，再一次性分类"""
+
+    _capture = None
+
+    def _classify_emotions(self, gray_faces):
+        if self._capture is not None:
+            self._capture.append(gray_faces)
+            return np.zeros((len(gray_faces), len(self._get_labels())))
+        return super()._classify_emotions(gray_faces)
+
+    def detect_emotions_batch(self, images, face_rectangles=None):
+        """返回与 images 等长的列表，每项与 detect_emotions 的返回格式相同"""
+        face_rectangles = face_rectangles or [None] * len(images)
+        self._capture = []
+        try:
+            frames = [self.detect_emotions(img, rects) for img, rects in zip(images, face_rectangles)]
+            captured = self._capture
+        finally:
+            self._capture = None
+
+        if not captured:
+            return frames
+
+        predictions = np.asarray(super()._classify_emotions(np.concatenate(captured)))
+        labels = self._get_labels()
+        row = 0
+        for faces in frames:
+            for face in faces:
+                face["emotions"] = {labels[idx]: round(float(score), 2)
+                                    for idx, score in enumerate(predictions[row])}
+                row += 1
+        return frames
+
+
+class InferenceServer:
+    def __init__(self, address, authkey, max_batch=16, max_wait=0.01, detector=None):
+        self.address = parse_address(address)
+        # 连接上收到的数据会被反序列化：只监听本机，且必须有连接密钥
+        if not is_local_address(self.address):
+            raise ValueError(f"face worker must listen on a loopback address or Unix socket, not {address}")
+        if not authkey or len(authkey) < MIN_AUTHKEY_LENGTH:
+            raise ValueError(f"face worker authkey must be at least {MIN_AUTHKEY_LENGTH} bytes")
+        self.authkey = authkey
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.detector = detector or BatchingFER()
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        with Listener(self.address, backlog=128, authkey=self.authkey) as listener:
+            log.info("face worker listening on %s (max_batch=%s, max_wait=%.3fs)",
+                     self.address, self.max_batch, self.max_wait)
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as e:
+                    log.warning("accept failed: %s", e)
+                    continue
+                threading.Thread(target=self._reader, args=(conn,), daemon=True).start()
+
+    def _reader(self, conn):
+        send_lock = threading.Lock()
+        try:
+            while True:
+                request_id, image, rects = conn.recv()
+                self.requests.put((conn, send_lock, request_id, image, rects))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.detector.detect_emotions_batch([item[3] for item in batch],
+                                                              [item[4] for item in batch])
+                replies = [(request_id, result, None) for (_, _, request_id, _, _), result in zip(batch, results)]
+            except Exception as e:
+                log.exception("batch inference failed")
+                replies = [(item[2], None, str(e)) for item in batch]
+
+            self.batches += 1
+            self.frames += len(batch)
+            for (conn, send_lock, *_), reply in zip(batch, replies):
+                try:
+                    with send_lock:
+                        conn.send(reply)
+                except (OSError, EOFError):
+                    pass  # 客户端已断开
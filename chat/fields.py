@@ -0,0 +1,36 @@
+from functools import cached_property
+
+from django.db import models
+
+# 情绪标签 ↔ 存储编码；编码就是在这个元组里的下标，已落库的数据依赖它，只能在末尾追加
+EMOTION_LABELS = ("happy", "sad", "angry", "surprise", "fear", "disgust", "neutral")
+EMOTION_CODES = {label: code for code, label in enumerate(EMOTION_LABELS)}
+
+
+class EmotionField(models.PositiveSmallIntegerField):
+    """
+    情绪标签在数据库里存成小整数（2 字节），Python 侧仍然读写 "happy" 这样的字符串，
+    filter(camera_emotion="sad")、values_list 等用法都不需要改。
+    """
+    description = "Emotion label stored as a small integer code"
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else EMOTION_LABELS[value]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return EMOTION_LABELS[int(value)]
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return EMOTION_CODES[value]
+        except KeyError:
+            raise ValueError(f"unknown emotion label: {value!r}") from None
+
+    @cached_property
+    def validators(self):
+        # Python 侧的值是标签而不是整数，不套用整数范围校验
+        return [*self.default_validators, *self._validators]
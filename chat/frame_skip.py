@@ -0,0 +1,97 @@
+"""
+摄像头帧的时间维度复用：连续帧几乎一样时不再重复做人脸检测和分类。
+
+每个客户端保存上一次真正推理时的缩略图签名（16x16 灰度）。新帧与之差异小于
+FRAME_CHANGE_THRESHOLD 且距上次推理不超过 FRAME_MAX_STALENESS 秒时，直接复用最近
+FRAME_SMOOTHING_WINDOW 次推理结果的多数票；否则重新推理。
+"""
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+
+SIGNATURE_SIZE = 16
+
+
+def signature(img):
+    """BGR 帧 → 16x16 灰度缩略图（int16，便于直接相减）"""
+    import cv2
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype("int16")
+
+
+def difference(a, b):
+    """两个签名的平均绝对差，范围 0~255"""
+    return float(abs(a - b).mean())
+
+
+class _ClientState:
+    __slots__ = ("signature", "computed_at", "recent")
+
+    def __init__(self, window):
+        self.signature = None
+        self.computed_at = 0.0
+        self.recent = deque(maxlen=window)
+
+    def smoothed(self):
+        # 多数票；票数相同时取最近的一次
+        counts = Counter(self.recent)
+        best = max(counts.values())
+        return next(e for e in reversed(self.recent) if counts[e] == best)
+
+
+class TemporalFilter:
+    def __init__(self, threshold, max_staleness, window, max_clients=10000):
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.window = window
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key):
+        with self._lock:
+            state = self._clients.get(key)
+            if state is None:
+                state = self._clients[key] = _ClientState(self.window)
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(key)
+            return state
+
+    def process(self, key, img, infer):
+        """
+        返回 (emotion, source)，source 为 "computed" 或 "reused"。
+        infer(img) 只在需要重新推理时调用，返回情绪标签。
+        """
+        state = self._state(key)
+        sig = signature(img)
+        now = time.monotonic()
+        if (state.signature is not None and state.recent
+                and now - state.computed_at <= self.max_staleness
+                and difference(sig, state.signature) < self.threshold):
+            return state.smoothed(), "reused"
+
+        emotion = infer(img)
+        state.signature = sig
+        state.computed_at = now
+        state.recent.append(emotion)
+        return emotion, "computed"
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                _filter = TemporalFilter(settings.FRAME_CHANGE_THRESHOLD,
+                                         settings.FRAME_MAX_STALENESS,
+                                         settings.FRAME_SMOOTHING_WINDOW)
+    return _filter
@@ -1,11 +1,16 @@
-import requests
-import os
+import json
+import logging
+from functools import lru_cache
+
+from django.conf import settings
 from dotenv import load_dotenv
 
+from . import llm_client, metrics
+from .fields import EMOTION_LABELS
+
 load_dotenv()  # 加载 .env 文件
 
-API_KEY = os.getenv("OPENROUTER_API_KEY")
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
+log = logging.getLogger(__name__)
 
 # ✅ 支持的风格
 CHAT_STYLES = {
@@ -15,90 +20,276 @@ CHAT_STYLES = {
     "cartoon": "As a lively and humorous cartoon character, reply with fun and positive energy."
 }
 
-def generate_response(user_input, style="friend", history=None):
-    """
-    根据用户输入和聊天风格生成自然回复，支持上下文和 Few-shot 示例。
-    - style: "friend", "psychologist", "parent", "cartoon"
-    - history: 上下文消息列表 [{"user": "...", "bot": "..."}]
-    """
-
-    # ✅ 风格描述
-    style_prompt = CHAT_STYLES.get(style, CHAT_STYLES["friend"])
+FALLBACK_REPLY = "Oops, I encountered an error, but I'm still here for you. ❤️"
 
-    # ✅ Few-shot 示例 (覆盖不同风格 + 冲突处理)
-    few_shot_examples = [
-        # 🌟 Friend 风格
+# ✅ Few-shot 示例 (覆盖不同风格 + 冲突处理)，按块存放，每种风格只注入相关的块
+FEW_SHOT_BLOCKS = {
+    # 🌟 Friend 风格
+    "friend": [
         {"role": "system", "content": "You are a warm and empathetic friend who responds naturally and casually."},
         {"role": "user", "content": "I'm feeling really down today."},
         {"role": "assistant", "content": "Oh no, that sounds rough. Want to share what’s been bothering you? I’m here for you."},
         {"role": "user", "content": "I feel like no one understands me."},
         {"role": "assistant", "content": "I get that, feeling misunderstood can be really lonely. But I’m here, and I do want to understand."},
-
-        # 🌟 Psychological Counselor 风格
+    ],
+    # 🌟 Psychological Counselor 风格
+    "psychologist": [
         {"role": "system", "content": "You are a professional psychological counselor who listens calmly and supports the user emotionally."},
         {"role": "user", "content": "最近总是觉得焦虑，很压抑。"},
         {"role": "assistant", "content": "谢谢你分享这个感受，这一定不容易。能聊聊让你焦虑的原因吗？"},
-
-        # 🌟 Parent 风格
+    ],
+    # 🌟 Parent 风格
+    "parent": [
         {"role": "system", "content": "You are like a caring parent who comforts and encourages."},
         {"role": "user", "content": "我今天心情不好，什么都不想做。"},
         {"role": "assistant", "content": "宝贝，没关系的，偶尔有这样的日子很正常。你愿意告诉我是什么让你这么累吗？"},
-
-        # 🌟 情绪冲突示例
+    ],
+    # 🌟 情绪冲突示例（所有风格通用）
+    "conflict": [
         {"role": "system", "content": "You notice a conflict between facial and text emotion, and respond gently."},
         {"role": "user", "content": "I’m fine, really."},
         {"role": "assistant", "content": "I hear you saying you’re fine, but you seem a bit down. That’s okay—we can talk about anything if you want."}
-    ]
+    ],
+}
+
+# 卡通风格没有专门的示例，沿用朋友风格的随意语气
+STYLE_FEW_SHOTS = {
+    "friend": ("friend", "conflict"),
+    "psychologist": ("psychologist", "conflict"),
+    "parent": ("parent", "conflict"),
+    "cartoon": ("friend", "conflict"),
+}
+
+
+def _build_prefix(style):
+    messages = [{"role": "system", "content": f"You are an empathetic assistant. {CHAT_STYLES[style]}"}]
+    for block in STYLE_FEW_SHOTS[style]:
+        messages += FEW_SHOT_BLOCKS[block]
+    return tuple(messages)
 
-    # ✅ 构建消息
-    messages = [{"role": "system", "content": f"You are an empathetic assistant. {style_prompt}"}]
-    messages += few_shot_examples  # 注入 Few-shot 示例
+
+# ✅ 每种风格的固定前缀（风格说明 + Few-shot）只在导入时拼一次，调用方不要修改其中的 dict
+PROMPT_PREFIXES = {style: _build_prefix(style) for style in CHAT_STYLES}
+
+
+def _is_cjk(ch):
+    return "\u3000" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af" or "\uff00" <= ch <= "\uffef"
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text):
+    """
+    粗略估算 token 数：中日韩字符约 1 字 1 token，其余约 4 个字符 1 token，另加每条消息的固定开销。
+    同一条历史消息每轮都会被估算，结果按原文缓存。
+    """
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + (len(text) - cjk + 3) // 4 + 4
+
+
+def trim_history(history, budget=None):
+    """从最近一轮往前取，直到下一轮放不进 token 预算（默认 settings.PROMPT_HISTORY_TOKEN_BUDGET）；返回按时间顺序的轮次列表"""
+    budget = settings.PROMPT_HISTORY_TOKEN_BUDGET if budget is None else budget
+    kept = []
+    for msg in reversed(history or []):
+        cost = estimate_tokens(msg["user"]) + estimate_tokens(msg["bot"])
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append(msg)
+    return kept[::-1]
+
+
+def build_messages(user_input, style="friend", history=None, budget=None, summary=""):
+    """
+    根据用户输入和聊天风格构建 messages，支持上下文和 Few-shot 示例。
+    - style: "friend", "psychologist", "parent", "cartoon"
+    - history: 上下文消息列表 [{"user": "...", "bot": "..."}]，按 token 预算截取最近的轮次
+    - summary: 更早对话的摘要（见 conversation.py），放在历史之前
+    """
+    messages = list(PROMPT_PREFIXES.get(style, PROMPT_PREFIXES["friend"]))
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation with this user: {summary}"})
 
     # ✅ 添加历史上下文
-    if history:
-        for msg in history[-6:]:  # 取最近6轮，避免 prompt 太长
-            messages.append({"role": "user", "content": msg["user"]})
-            messages.append({"role": "assistant", "content": msg["bot"]})
+    for msg in trim_history(history, budget):
+        messages.append({"role": "user", "content": msg["user"]})
+        messages.append({"role": "assistant", "content": msg["bot"]})
 
     # ✅ 当前用户输入
     messages.append({"role": "user", "content": user_input})
+    return messages
+
+
+def _reply_payload(messages):
+    return {
+        "model": "meta-llama/llama-3-8b-instruct",  # ✅ LLaMA-3 模型
+        "messages": messages,
+        "temperature": 0.85,  # 增加创造性
+        "top_p": 0.9
+    }
+
+
+def _llm_failed(call, error, fallback=False):
+    metrics.inc("llm_errors_total", call=call)
+    if fallback:
+        metrics.inc("fallback_replies_total", call=call)
+    log.warning("llm request failed", extra={"call": call, "error": str(error), "fallback": fallback})
+
+
+def generate_response(user_input, style="friend", history=None, summary=""):
+    """
+    根据用户输入和聊天风格生成自然回复（同步版本）。
+    参数同 build_messages。
+    """
+    messages = build_messages(user_input, style, history, summary=summary)
+
+    log.debug("llm request", extra={"call": "reply", "style": style, "messages": len(messages)})
+
+    try:
+        with metrics.span("reply"):
+            result = llm_client.chat_completion(_reply_payload(messages))
+        reply = result["choices"][0]["message"]["content"]
+        return reply.strip()
+
+    except Exception as e:
+        _llm_failed("reply", e, fallback=True)
+        return FALLBACK_REPLY
 
-    print("🔥 调用 GPT，风格:", style)
-    print("上下文消息数量:", len(messages))
+
+async def agenerate_response(user_input, style="friend", history=None, summary=""):
+    """
+    generate_response 的异步版本，不阻塞事件循环。
+    """
+    messages = build_messages(user_input, style, history, summary=summary)
+
+    log.debug("llm request", extra={"call": "reply", "style": style, "messages": len(messages)})
 
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "meta-llama/llama-3-8b-instruct",  # ✅ LLaMA-3 模型
-                "messages": messages,
-                "temperature": 0.85,  # 增加创造性
-                "top_p": 0.9
-            },
-            timeout=30
-        )
-
-        print(f"✅ API HTTP 状态码: {response.status_code}")
-        response.raise_for_status()
-        result = response.json()
+        with metrics.span("reply"):
+            result = await llm_client.achat_completion(_reply_payload(messages))
         reply = result["choices"][0]["message"]["content"]
         return reply.strip()
 
     except Exception as e:
-        print("❌ OpenRouter API 出错:", e)
-        return "Oops, I encountered an error, but I'm still here for you. ❤️"
+        _llm_failed("reply", e, fallback=True)
+        return FALLBACK_REPLY
+
+
+async def astream_response(user_input, style="friend", history=None, summary=""):
+    """
+    流式生成回复：请求时带上 stream: true，逐块 yield 文本。
+    出错且尚未输出任何内容时，yield 兜底回复。
+    """
+    messages = build_messages(user_input, style, history, summary=summary)
+
+    log.debug("llm request", extra={"call": "stream", "style": style, "messages": len(messages)})
+
+    sent_any = False
+    try:
+        with metrics.span("reply_stream"):
+            async for delta in llm_client.astream_chat_completion(_reply_payload(messages)):
+                sent_any = True
+                yield delta
+
+    except Exception as e:
+        _llm_failed("stream", e, fallback=not sent_any)
+        if not sent_any:
+            yield FALLBACK_REPLY
+
+
+# ✅ 合并模式：一次请求同时返回情绪标签、原因和回复（CHAT_RESPONSE_MODE = "combined"）
+COMBINED_INSTRUCTION = (
+    "Before replying, classify the emotion of the user's latest message as one of "
+    f"{list(EMOTION_LABELS)}. Respond ONLY with a JSON object of the form "
+    '{"emotion": "<emotion>", "reason": "<short reason>", "reply": "<your reply to the user>"} '
+    "and nothing else. Write the reply in your usual style and in the user's language."
+)
 
 
-# ✅ 测试代码
-if __name__ == "__main__":
-    # 模拟历史上下文
-    test_history = [
-        {"user": "Hi, I feel a bit sad today.", "bot": "I'm sorry to hear that. Do you want to talk about it?"},
-        {"user": "Yes, it's just stressful at work.", "bot": "That sounds tough. How long have you been feeling this way?"}
+def build_combined_messages(user_input, style="friend", history=None, summary=""):
+    messages = build_messages(user_input, style, history, summary=summary)
+    messages.insert(-1, {"role": "system", "content": COMBINED_INSTRUCTION})
+    return messages
+
+
+def _find_json_object(text, key):
+    """从模型输出里找出第一个含 key 的 JSON 对象（容忍 ```json 代码块和前后多余的文字）"""
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(text, start)
+        except json.JSONDecodeError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(data, dict) and key in data:
+            return data
+        start = text.find("{", start + 1)
+    return None
+
+
+def parse_combined(content):
+    """合并模式的输出 → (emotion, reason, reply)；格式不对返回 None，由调用方退回两次调用"""
+    data = _find_json_object(content or "", "reply")
+    if data is None:
+        return None
+    reply = data.get("reply")
+    if not isinstance(reply, str) or not reply.strip():
+        return None
+    emotion = str(data.get("emotion", "neutral")).strip().lower()
+    reason = data.get("reason") or "未提供原因"
+    return emotion if emotion in EMOTION_LABELS else "neutral", str(reason), reply.strip()
+
+
+async def acombined_response(user_input, style="friend", history=None, summary=""):
+    """
+    合并模式：一次请求拿到 (emotion, reason, reply)。
+    请求失败、响应结构不对或 JSON 不合法时返回 None。
+    """
+    messages = build_combined_messages(user_input, style, history, summary)
+
+    log.debug("llm request", extra={"call": "combined", "style": style, "messages": len(messages)})
+
+    try:
+        with metrics.span("combined"):
+            result = await llm_client.achat_completion(_reply_payload(messages))
+    except Exception as e:
+        _llm_failed("combined", e)
+        return None
+    try:
+        content = result["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        # 响应结构不对（没有 choices / message）也按格式错误处理
+        content = None
+    parsed = parse_combined(content)
+    if parsed is None:
+        metrics.inc("combined_fallbacks_total")
+        log.warning("combined response is not valid JSON, falling back to separate calls")
+    return parsed
+
+
+SUMMARY_PROMPT = (
+    "You maintain a short memory of a supportive conversation between a user and their companion. "
+    "Update the summary with the new turns. Keep facts about the user, their feelings, ongoing worries "
+    "and anything the companion promised. Write at most 120 words in the language the user mostly uses. "
+    "Output only the summary."
+)
+
+
+def summarize_conversation(summary, turns):
+    """把旧摘要和若干轮对话压缩成新摘要（后台任务调用，不在请求路径上）"""
+    transcript = "\n".join(f"User: {t['user']}\nCompanion: {t['bot']}" for t in turns)
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
     ]
-    print("🔥 测试回复：")
-    print(generate_response("I don't know what to do next.", style="psychologist", history=test_history))
+    try:
+        result = llm_client.chat_completion({
+            "model": "meta-llama/llama-3-8b-instruct",
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": 200,
+        })
+    except Exception as e:
+        _llm_failed("summary", e)
+        raise
+    return result["choices"][0]["message"]["content"].strip()
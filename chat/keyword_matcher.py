@@ -0,0 +1,130 @@
+"""
+情绪关键词匹配器：启动时把词表编译成一个正则，一次扫描找出全部命中。
+
+- 词表来自 JSON 数据文件（默认 chat/data/emotion_keywords.json，可用 settings.EMOTION_KEYWORDS_FILE 覆盖）
+- 关键词先按前缀合并成字典树再生成正则，词表扩到上千条时单条消息的匹配开销基本不变
+- 英文按整词匹配，中文按子串匹配
+- 否定词（"not happy"、"不开心"）会把命中转给 negation_flip 指定的情绪（默认 neutral），权重减半
+"""
+import json
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_KEYWORDS_FILE = Path(__file__).resolve().parent / "data" / "emotion_keywords.json"
+
+_CJK = re.compile(r"[一-鿿]")
+_EN_WORD = re.compile(r"[a-z']+")
+_CLAUSE_BREAK = re.compile(r"[,.!?;:，。！？；：\n]")
+NEGATION_WEIGHT = 0.5
+# 否定词与情绪词之间允许隔开的距离：英文按词数，中文按字数
+EN_NEGATION_WINDOW = 3
+ZH_NEGATION_WINDOW = 2
+
+
+def _trie_regex(words):
+    """把词列表编译成按公共前缀合并的正则片段，"sad|sadness" → "sad(?:ness)?" """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        optional = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if optional else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    def __init__(self, emotions, negations=None, negation_flip=None):
+        negations = negations or {}
+        self.emotions = list(emotions)
+        self.negation_flip = negation_flip or {}
+        self.en_negations = frozenset(negations.get("en", []))
+        self.zh_negations = frozenset(negations.get("zh", []))
+
+        # 同一个词可能出现在多类情绪下
+        self.terms = {}
+        for emotion, terms in emotions.items():
+            for term, weight in terms.items():
+                self.terms.setdefault(term.lower(), []).append((emotion, weight))
+
+        en_terms = [t for t in self.terms if not _CJK.search(t)]
+        zh_terms = [t for t in self.terms if _CJK.search(t)]
+        parts = []
+        if en_terms:
+            parts.append(r"(?<![a-z'])" + _trie_regex(en_terms) + r"(?![a-z'])")
+        if zh_terms:
+            parts.append(_trie_regex(zh_terms))
+        self.pattern = re.compile("|".join(parts)) if parts else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["emotions"], data.get("negations"), data.get("negation_flip"))
+
+    def _negated(self, text, start, term):
+        # 否定只在同一分句内生效："not happy, I'm furious" 里的 furious 不算被否定
+        preceding = _CLAUSE_BREAK.split(text[max(0, start - 40):start])[-1]
+        if _CJK.search(term):
+            return any(ch in self.zh_negations for ch in preceding[-ZH_NEGATION_WINDOW:])
+        words = _EN_WORD.findall(preceding)[-EN_NEGATION_WINDOW:]
+        return any(word in self.en_negations or word.endswith("n't") for word in words)
+
+    def matches(self, text):
+        """返回 [(term, emotion, weight, negated)]，已按否定规则转换情绪和权重"""
+        if self.pattern is None:
+            return []
+        text = text.lower()
+        hits = []
+        for m in self.pattern.finditer(text):
+            term = m.group(0)
+            negated = self._negated(text, m.start(), term)
+            for emotion, weight in self.terms[term]:
+                if negated:
+                    emotion, weight = self.negation_flip.get(emotion, "neutral"), weight * NEGATION_WEIGHT
+                hits.append((term, emotion, weight, negated))
+        return hits
+
+    def score(self, text):
+        """每类情绪的加权得分"""
+        scores = dict.fromkeys(self.emotions, 0.0)
+        for _, emotion, weight, _ in self.matches(text):
+            scores[emotion] = scores.get(emotion, 0.0) + weight
+        return scores
+
+    def score_many(self, texts):
+        """批量打分，返回与 texts 等长的得分列表"""
+        return [self.score(text) for text in texts]
+
+    def best(self, text):
+        """得分最高的情绪；没有任何命中时返回 None"""
+        scores = self.score(text)
+        emotion = max(scores, key=scores.get)
+        return emotion if scores[emotion] > 0 else None
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                path = getattr(settings, "EMOTION_KEYWORDS_FILE", None) or DEFAULT_KEYWORDS_FILE
+                _matcher = KeywordMatcher.from_file(path)
+    return _matcher
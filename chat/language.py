@@ -0,0 +1,96 @@
+"""
+消息语言识别。结果只用来选关心语（中文 / 其他）和返回给前端，所以先看 Unicode 区段：
+- 含假名 → ja，含谚文 → ko，含汉字 → zh（中英混写也算中文）
+- 只有 ASCII 字母/数字/标点 → en
+- 其余（带重音的拉丁字母、西里尔字母等）才交给 langdetect：固定 seed 保证同一句话结果不变，
+  语言 profile 在第一次用到时加载一次
+
+同一个用户很少中途换语言：区段判断不出来时先用这个用户上次的结果，没有才调用 langdetect。
+缓存按客户端（登录用户 / Django 会话 / IP，见 emotion_state.client_key）区分，不按 ChatSession——
+三个动物会话是所有用户共用的。
+"""
+import re
+import threading
+from collections import OrderedDict
+
+_KANA = re.compile(r"[぀-ヿㇰ-ㇿ]")
+_HANGUL = re.compile(r"[ᄀ-ᇿ㄰-㆏가-힯]")
+_HAN = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+_ASCII_LETTER = re.compile(r"[A-Za-z]")
+
+DEFAULT = "en"
+
+
+def by_script(text):
+    """按字符区段判断；判断不出来返回 None"""
+    if _KANA.search(text):
+        return "ja"
+    if _HANGUL.search(text):
+        return "ko"
+    if _HAN.search(text):
+        return "zh"
+    if text.isascii() and _ASCII_LETTER.search(text):
+        return "en"
+    return None
+
+
+_detect = None
+_detect_lock = threading.Lock()
+
+
+def _langdetect(text):
+    global _detect
+    if _detect is None:
+        with _detect_lock:
+            if _detect is None:
+                from langdetect import DetectorFactory, detect
+                from langdetect.detector_factory import init_factory
+
+                DetectorFactory.seed = 0
+                init_factory()  # 加载全部语言 profile
+                _detect = detect
+    try:
+        return _detect(text)
+    except Exception:
+        # 没有可识别的字符（纯数字、表情等）
+        return None
+
+
+class ClientLanguages:
+    """客户端 → 最近一次识别出的语言，超过 max_clients 时淘汰最久未用的"""
+
+    def __init__(self, max_clients=10000):
+        self.max_clients = max_clients
+        self._languages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client):
+        with self._lock:
+            language = self._languages.get(client)
+            if language is not None:
+                self._languages.move_to_end(client)
+            return language
+
+    def set(self, client, language):
+        with self._lock:
+            self._languages[client] = language
+            self._languages.move_to_end(client)
+            while len(self._languages) > self.max_clients:
+                self._languages.popitem(last=False)
+
+
+_clients = ClientLanguages()
+
+
+def detect(text, client=None):
+    """返回语言代码（如 "zh"、"en"）；传入 client 时使用并更新该客户端的缓存"""
+    language = by_script(text)
+    if language is None and client is not None:
+        language = _clients.get(client)
+        if language is not None:
+            return language
+    if language is None:
+        language = _langdetect(text) or DEFAULT
+    if client is not None:
+        _clients.set(client, language)
+    return language
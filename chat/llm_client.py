@@ -0,0 +1,287 @@
+"""
+OpenRouter（OpenAI 兼容 chat-completions）的共享客户端，gpt_helper 和 views 都经由这里发请求。
+
+- 连接池：同步调用共用一个 httpx.Client，异步调用每个事件循环一个 httpx.AsyncClient，keep-alive 复用 TCP/TLS
+- 超时：连接超时与读取超时分开设置，读取超时可按调用覆盖
+- 重试：只对没连上（连接失败/连接超时/连接池等待超时）和 429/5xx 做有限次重试，指数退避 + 全抖动；
+  读取超时等请求已发出后的错误不重试，避免一次调用耗时翻倍
+- 熔断：上游连续失败达到阈值后在冷却期内直接抛 CircuitOpenError，调用方走原有兜底文案；
+  4xx（429 除外）是请求本身的问题，不计入失败
+- LLM_BASE_URL 可配置，测试/压测时可指向本地 stub 服务
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "2"))
+BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+)
+
+# 请求还没到达上游的网络错误，可以放心重试
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class LLMError(Exception):
+    """LLM 请求失败（重试耗尽或不可重试的错误）"""
+
+
+class CircuitOpenError(LLMError):
+    """熔断器打开，请求未发出"""
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器：closed → open（冷却期内拒绝）→ half-open（放行一个探测请求）"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            # 探测请求被调用方中途放弃时，超过一个冷却期后允许再探测
+            stale_probe = time.monotonic() - self.probe_started > self.cooldown
+            if state == "half-open" and (not self.probing or stale_probe):
+                self.probing = True
+                self.probe_started = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """请求有了结果但说明不了上游是否正常（如 4xx）：不改失败计数，只结束探测"""
+        with self._lock:
+            self.probing = False
+
+
+breaker = CircuitBreaker()
+
+_sync_client = None
+_sync_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _headers():
+    return {
+        "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+
+
+def _timeout(read_timeout):
+    return httpx.Timeout(read_timeout or READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def _url():
+    return f"{BASE_URL}/chat/completions"
+
+
+def get_client():
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(limits=POOL_LIMITS, timeout=_timeout(None))
+    return _sync_client
+
+
+def get_async_client():
+    # AsyncClient 的连接池绑定事件循环，每个循环各用一个
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(limits=POOL_LIMITS, timeout=_timeout(None))
+        _async_clients[loop] = client
+    return client
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def _transport_failed(error):
+    """请求已发出后的网络错误（读取超时、连接被断开等）：计入熔断，不重试"""
+    breaker.record_failure()
+    return LLMError(str(error) or type(error).__name__)
+
+
+def _client_error(response):
+    """4xx（429 除外）：上游正常应答，是请求本身的问题（参数、鉴权），不计入熔断"""
+    if response.is_client_error and not _retryable(response.status_code):
+        breaker.release()
+        return LLMError(f"HTTP {response.status_code}")
+    return None
+
+
+def _result(response):
+    try:
+        response.raise_for_status()
+        result = response.json()
+    except Exception as e:
+        breaker.record_failure()
+        raise LLMError(str(e)) from e
+    breaker.record_success()
+    return result
+
+
+def chat_completion(payload, read_timeout=None):
+    """同步请求 chat-completions，返回解析后的 JSON"""
+    if not breaker.allow():
+        raise CircuitOpenError("LLM circuit open")
+
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(_backoff(attempt - 1))
+        try:
+            response = get_client().post(_url(), headers=_headers(), json=payload,
+                                         timeout=_timeout(read_timeout))
+        except RETRY_ERRORS as e:
+            last_error = e
+            continue
+        except httpx.TransportError as e:
+            raise _transport_failed(e) from e
+        if _retryable(response.status_code):
+            last_error = LLMError(f"HTTP {response.status_code}")
+            continue
+        error = _client_error(response)
+        if error is not None:
+            raise error
+        return _result(response)
+
+    breaker.record_failure()
+    raise LLMError(f"retries exhausted: {last_error}") from last_error
+
+
+async def achat_completion(payload, read_timeout=None):
+    """chat_completion 的异步版本"""
+    if not breaker.allow():
+        raise CircuitOpenError("LLM circuit open")
+
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(_backoff(attempt - 1))
+        try:
+            response = await get_async_client().post(_url(), headers=_headers(), json=payload,
+                                                     timeout=_timeout(read_timeout))
+        except RETRY_ERRORS as e:
+            last_error = e
+            continue
+        except httpx.TransportError as e:
+            raise _transport_failed(e) from e
+        if _retryable(response.status_code):
+            last_error = LLMError(f"HTTP {response.status_code}")
+            continue
+        error = _client_error(response)
+        if error is not None:
+            raise error
+        return _result(response)
+
+    breaker.record_failure()
+    raise LLMError(f"retries exhausted: {last_error}") from last_error
+
+
+async def astream_chat_completion(payload, read_timeout=None):
+    """
+    以 stream: true 请求，逐块 yield 文本增量。
+    只在收到首个字节之前重试，已经开始输出后出错直接抛 LLMError。
+    """
+    if not breaker.allow():
+        raise CircuitOpenError("LLM circuit open")
+
+    payload = dict(payload, stream=True)
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(_backoff(attempt - 1))
+        try:
+            request = get_async_client().build_request("POST", _url(), headers=_headers(), json=payload,
+                                                       timeout=_timeout(read_timeout))
+            response = await get_async_client().send(request, stream=True)
+        except RETRY_ERRORS as e:
+            last_error = e
+            continue
+        except httpx.TransportError as e:
+            raise _transport_failed(e) from e
+
+        if _retryable(response.status_code):
+            await response.aclose()
+            last_error = LLMError(f"HTTP {response.status_code}")
+            continue
+        error = _client_error(response)
+        if error is not None:
+            await response.aclose()
+            raise error
+
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # SSE 格式：以 "data:" 开头，": " 开头的是注释/心跳
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+            breaker.record_success()
+            return
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMError(str(e)) from e
+        finally:
+            await response.aclose()
+
+    breaker.record_failure()
+    raise LLMError(f"retries exhausted: {last_error}") from last_error
@@ -0,0 +1,60 @@
+"""
+进程内的文字情绪分类器（中英双语，CPU 上毫秒级）。
+
+基于加权情绪词典（keyword_matcher，含否定处理）打分，英文再参考 TextBlob 的情感极性；
+返回 (emotion, confidence)。
+置信度低于 settings.TEXT_EMOTION_CONFIDENCE_THRESHOLD 时由 views 回退到 LLM。
+"""
+import re
+
+from .keyword_matcher import get_matcher
+
+_CJK = re.compile(r"[一-鿿]")
+
+_textblob = None
+
+
+def _load_textblob():
+    # textblob 会连带导入 nltk，首次用到时才加载；未安装时只用词典
+    global _textblob
+    if _textblob is None:
+        try:
+            from textblob import TextBlob
+        except ImportError:
+            TextBlob = False
+        _textblob = TextBlob
+    return _textblob
+
+
+def _polarity(text):
+    if _CJK.search(text):
+        return 0.0
+    TextBlob = _load_textblob()
+    if not TextBlob:
+        return 0.0
+    try:
+        return TextBlob(text).sentiment.polarity
+    except Exception:
+        return 0.0
+
+
+def score(text):
+    """返回每类情绪的得分 dict"""
+    scores = get_matcher().score(text)
+    polarity = _polarity(text)
+    if polarity >= 0.5:
+        scores["happy"] += polarity * 0.5
+    elif polarity <= -0.5:
+        scores["sad"] += -polarity * 0.5
+    return scores
+
+
+def classify(text):
+    """返回 (emotion, confidence)，confidence ∈ [0, 1)；没有任何证据时为 ("neutral", 0.0)"""
+    scores = score(text)
+    total = sum(scores.values())
+    if total == 0:
+        return "neutral", 0.0
+    emotion = max(scores, key=scores.get)
+    # 单个强命中约 0.77，同类多次命中趋近 1，多类冲突时下降
+    return emotion, scores[emotion] / (total + 0.3)
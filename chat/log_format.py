@@ -0,0 +1,41 @@
+"""
+日志格式（settings.LOG_FORMAT）：
+- text：时间 级别 logger 消息 key=value...
+- json：每条日志一行 JSON，方便日志系统直接解析
+
+extra= 传入的字段原样输出，例如 log.warning("llm request failed", extra={"call": "reply", "error": str(e)})
+"""
+import json
+import logging
+import time
+
+# LogRecord 自带的属性，不当作 extra 字段输出
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class KeyValueFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in _extras(record).items())
+        return f"{line} {fields}" if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import emotion_stats
+
+
+class Command(BaseCommand):
+    help = "按时间顺序重放 EmotionLog，为已有会话补齐累计情绪统计（EmotionStats）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", type=int, default=None, help="只回填某个会话")
+        parser.add_argument("--alpha", type=float, default=None,
+                            help="指数衰减权重，默认取 settings.EMOTION_STATS_ALPHA")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        sessions = emotion_stats.backfill(options["session"], alpha=options["alpha"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"回填 {sessions} 个会话，用时 {elapsed:.2f}s"))
@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat import local_emotion
+from chat.models import ChatLog
+
+
+class Command(BaseCommand):
+    help = "对比本地文字情绪分类器与 ChatLog.text_emotion 中已存的标签，报告一致率与覆盖率"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=None,
+                            help="置信度阈值，默认取 settings.TEXT_EMOTION_CONFIDENCE_THRESHOLD")
+        parser.add_argument("--limit", type=int, default=None, help="只评估最近 N 条")
+        parser.add_argument("--session", type=int, default=None, help="只评估某个会话")
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if threshold is None:
+            threshold = settings.TEXT_EMOTION_CONFIDENCE_THRESHOLD
+
+        logs = ChatLog.objects.order_by("-created_at")
+        if options["session"] is not None:
+            logs = logs.filter(session_id=options["session"])
+        if options["limit"]:
+            logs = logs[:options["limit"]]
+
+        total = agree = confident = confident_agree = 0
+        per_label = Counter()
+        per_label_agree = Counter()
+        elapsed = 0.0
+        for message, stored in logs.values_list("user_message", "text_emotion").iterator():
+            start = time.perf_counter()
+            predicted, confidence = local_emotion.classify(message)
+            elapsed += time.perf_counter() - start
+
+            total += 1
+            per_label[stored] += 1
+            if predicted == stored:
+                agree += 1
+                per_label_agree[stored] += 1
+            if confidence >= threshold:
+                confident += 1
+                confident_agree += predicted == stored
+
+        if not total:
+            self.stdout.write("没有可评估的 ChatLog 记录")
+            return
+
+        self.stdout.write(f"样本数: {total}")
+        self.stdout.write(f"整体一致率: {agree / total:.1%}")
+        self.stdout.write(f"阈值 {threshold:.2f} 下本地直接采用的比例: {confident / total:.1%}")
+        if confident:
+            self.stdout.write(f"其中与存量标签一致: {confident_agree / confident:.1%}")
+        self.stdout.write(f"平均耗时: {elapsed / total * 1000:.3f} ms/条")
+        for label, count in per_label.most_common():
+            self.stdout.write(f"  {label:<9} {per_label_agree[label]}/{count} ({per_label_agree[label] / count:.1%})")
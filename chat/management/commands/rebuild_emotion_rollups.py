@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import rollups
+
+
+class Command(BaseCommand):
+    help = "从 EmotionLog 历史记录重建情绪分桶汇总表（EmotionRollup）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", type=int, default=None, help="只重建某个会话")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = rollups.rebuild(options["session"], batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - start
+        scope = f"会话 {options['session']}" if options["session"] is not None else "全部会话"
+        self.stdout.write(self.style.SUCCESS(f"{scope}：写入 {written} 行汇总，用时 {elapsed:.2f}s"))
@@ -0,0 +1,29 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.face_client import get_authkey
+from chat.face_worker import InferenceServer
+
+
+class Command(BaseCommand):
+    help = "启动表情识别推理进程（模型只加载一次，跨请求微批次推理）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", default=settings.FACE_WORKER_ADDRESS or "127.0.0.1:6010",
+                            help="监听地址，本机回环地址的 host:port 或 Unix socket 路径")
+        parser.add_argument("--max-batch", type=int, default=settings.FACE_WORKER_MAX_BATCH)
+        parser.add_argument("--max-wait-ms", type=float, default=settings.FACE_WORKER_MAX_WAIT_MS)
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO)
+        try:
+            server = InferenceServer(options["address"], get_authkey(),
+                                     max_batch=options["max_batch"],
+                                     max_wait=options["max_wait_ms"] / 1000)
+        except (ImproperlyConfigured, ValueError) as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(f"face worker ready on {options['address']}")
+        server.serve_forever()
@@ -0,0 +1,170 @@
+"""
+进程内的指标与请求分段计时。
+
+    with metrics.span("reply"):          # 同步/异步代码都可以用
+        ...
+    metrics.record("decode", seconds)    # 已经自己计时的阶段
+    metrics.inc("llm_errors_total", call="reply")
+
+- 每个阶段的耗时写进当前请求的 Server-Timing 响应头（由 chat.middleware.ServerTimingMiddleware 输出），
+  同时累计到 stage_duration_seconds{stage} 直方图
+- render() 输出 Prometheus 文本格式，/metrics 使用
+- 每个进程各自统计；多 worker 部署时由 Prometheus 分别抓取再聚合
+- 流式响应的响应头在生成开始前就已发出，之后的阶段只进直方图
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "请求处理耗时（流式响应只计到响应头）"),
+    "stage_duration_seconds": ("histogram", "请求内各阶段耗时"),
+    "llm_errors_total": ("counter", "LLM 请求失败次数"),
+    "fallback_replies_total": ("counter", "LLM 失败后返回兜底回复的次数"),
+    "combined_fallbacks_total": ("counter", "合并模式输出不合法、退回两次调用的次数"),
+    "text_emotion_source_total": ("counter", "文本情绪结果来源：local / cache / llm / error"),
+    "camera_frames_total": ("counter", "摄像头帧：computed 为实际推理，其余为复用"),
+    "throttled_total": ("counter", "被限流拒绝的请求"),
+    "emotion_cache_lookups_total": ("counter", "文本情绪缓存查询：hit / shared_hit / miss"),
+    "admission_in_flight": ("gauge", "准入控制：正在处理的请求"),
+    "admission_queued": ("gauge", "准入控制：排队中的请求"),
+    "admission_shed_total": ("counter", "准入控制：被拒绝（503）的请求"),
+}
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def samples(self):
+        """[(name, [(suffix, labels, value)...])]，按名称排序"""
+        families = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                families.setdefault(name, []).append(("", labels, value))
+            for (name, labels), h in self._histograms.items():
+                rows = families.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    rows.append(("_bucket", labels + (("le", repr(bound)),), cumulative))
+                rows.append(("_bucket", labels + (("le", "+Inf"),), h.count))
+                rows.append(("_sum", labels, round(h.total, 6)))
+                rows.append(("_count", labels, h.count))
+        return sorted(families.items())
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+# 当前请求的 [(阶段, 秒)]；由中间件设置，asyncio.gather 的子任务和 sync_to_async 线程共享同一个列表
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+def start_request():
+    timings = []
+    return timings, _timings.set(timings)
+
+
+def end_request(token):
+    _timings.reset(token)
+
+
+def record(stage, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    observe("stage_duration_seconds", seconds, stage=stage)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _component_samples():
+    """准入控制与文本情绪缓存自己维护计数，抓取时再读出来"""
+    from . import admission, emotion_cache
+
+    rows = {"admission_in_flight": [], "admission_queued": [], "admission_shed_total": [],
+            "emotion_cache_lookups_total": []}
+    for gate, stats in admission.stats().items():
+        labels = (("gate", gate),)
+        rows["admission_in_flight"].append(("", labels, stats["in_flight"]))
+        rows["admission_queued"].append(("", labels, stats["queued"]))
+        rows["admission_shed_total"].append(("", labels, stats["shed"]))
+    cache = emotion_cache.stats()
+    for key, result in (("hits", "hit"), ("shared_hits", "shared_hit"), ("misses", "miss")):
+        rows["emotion_cache_lookups_total"].append(("", (("result", result),), cache[key]))
+    return [(name, samples) for name, samples in rows.items() if samples]
+
+
+def render():
+    """Prometheus 文本格式（0.0.4）"""
+    lines = []
+    for name, samples in registry.samples() + _component_samples():
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,50 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    为每个请求收集 metrics.span 记录的阶段耗时，写入 Server-Timing 响应头（SERVER_TIMING_ENABLED），
+    并把总耗时按视图名累计到 http_request_duration_seconds。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, timings, start)
+
+    def _finish(self, request, response, timings, start):
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        metrics.observe("http_request_duration_seconds", elapsed,
+                        view=match.url_name if match and match.url_name else "unmatched",
+                        method=request.method, status=response.status_code)
+        if settings.SERVER_TIMING_ENABLED:
+            response["Server-Timing"] = metrics.server_timing(timings + [("total", elapsed)])
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('source', models.CharField(choices=[('camera', 'Camera'), ('text', 'Text')], max_length=10)),
+                ('emotion', models.CharField(choices=[('happy', 'Happy'), ('sad', 'Sad'), ('angry', 'Angry'), ('surprise', 'Surprise'), ('fear', 'Fear'), ('disgust', 'Disgust'), ('neutral', 'Neutral')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chat.chatsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'resolution', 'bucket', 'source', 'emotion'), name='unique_emotion_rollup_bucket')],
+            },
+        ),
+    ]
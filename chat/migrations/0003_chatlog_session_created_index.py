@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_emotion_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatlog',
+            index=models.Index(fields=['session', 'created_at'], name='chat_chatlo_session_3fe8e7_idx'),
+        ),
+    ]
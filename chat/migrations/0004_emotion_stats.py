@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatlog_session_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('m2', models.FloatField(default=0.0)),
+                ('ewma_mean', models.FloatField(default=0.0)),
+                ('ewma_var', models.FloatField(default=0.0)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='emotion_stats', to='chat.chatsession')),
+            ],
+        ),
+    ]
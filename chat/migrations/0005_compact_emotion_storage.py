@@ -0,0 +1,142 @@
+"""
+紧凑存储：
+- ChatLog / EmotionLog 的 camera_emotion、text_emotion 由字符串改为小整数编码（chat.fields.EmotionField）
+- EmotionLog 新增 chat_log 指向同一轮对话的 ChatLog，删除重复的 user_message / raw_text_emotion
+
+已有的 EmotionLog 按 (会话, 消息原文) 依时间顺序与 ChatLog 配对，配不上的 chat_log 留空。
+"""
+from collections import defaultdict, deque
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import chat.fields
+
+EMOTION_CHOICES = [
+    ("happy", "Happy"),
+    ("sad", "Sad"),
+    ("angry", "Angry"),
+    ("surprise", "Surprise"),
+    ("fear", "Fear"),
+    ("disgust", "Disgust"),
+    ("neutral", "Neutral"),
+]
+EMOTION_FIELDS = ("camera_emotion", "text_emotion")
+BATCH_SIZE = 1000
+
+
+def link_chat_logs(apps, schema_editor):
+    ChatLog = apps.get_model("chat", "ChatLog")
+    EmotionLog = apps.get_model("chat", "EmotionLog")
+
+    session_ids = EmotionLog.objects.values_list("session_id", flat=True).distinct()
+    for session_id in session_ids:
+        unclaimed = defaultdict(deque)
+        for pk, message in (ChatLog.objects.filter(session_id=session_id)
+                            .order_by("created_at", "id").values_list("id", "user_message")):
+            unclaimed[message].append(pk)
+
+        batch = []
+        for log in EmotionLog.objects.filter(session_id=session_id).order_by("timestamp", "id").only("id", "user_message"):
+            candidates = unclaimed.get(log.user_message)
+            if candidates:
+                log.chat_log_id = candidates.popleft()
+                batch.append(log)
+        EmotionLog.objects.bulk_update(batch, ["chat_log"], batch_size=BATCH_SIZE)
+
+
+def restore_user_messages(apps, schema_editor):
+    EmotionLog = apps.get_model("chat", "EmotionLog")
+    batch = []
+    for log in EmotionLog.objects.filter(chat_log__isnull=False).select_related("chat_log").iterator(BATCH_SIZE):
+        log.user_message = log.chat_log.user_message
+        batch.append(log)
+    EmotionLog.objects.bulk_update(batch, ["user_message"], batch_size=BATCH_SIZE)
+
+
+def _copy(apps, source_suffix, target_suffix):
+    labels = set(chat.fields.EMOTION_LABELS)
+    for model_name in ("ChatLog", "EmotionLog"):
+        model = apps.get_model("chat", model_name)
+        targets = [field + target_suffix for field in EMOTION_FIELDS]
+        batch = []
+        for row in model.objects.only("id", *(field + source_suffix for field in EMOTION_FIELDS)).iterator(BATCH_SIZE):
+            for field in EMOTION_FIELDS:
+                value = (getattr(row, field + source_suffix) or "neutral").lower()
+                setattr(row, field + target_suffix, value if value in labels else "neutral")
+            batch.append(row)
+        model.objects.bulk_update(batch, targets, batch_size=BATCH_SIZE)
+
+
+def labels_to_codes(apps, schema_editor):
+    _copy(apps, "_label", "")
+
+
+def codes_to_labels(apps, schema_editor):
+    _copy(apps, "", "_label")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0004_emotion_stats"),
+    ]
+
+    operations = [
+        # 1. EmotionLog → ChatLog 关联
+        migrations.AddField(
+            model_name="emotionlog",
+            name="chat_log",
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                       related_name="emotion_log", to="chat.chatlog"),
+        ),
+        migrations.RunPython(link_chat_logs, migrations.RunPython.noop),
+
+        # 2. 情绪字段：旧列改名，新建整数列，复制后删除旧列
+        *[
+            migrations.RenameField(model_name=model, old_name=field, new_name=f"{field}_label")
+            for model in ("chatlog", "emotionlog") for field in EMOTION_FIELDS
+        ],
+        *[
+            migrations.AddField(
+                model_name=model,
+                name=field,
+                field=chat.fields.EmotionField(choices=EMOTION_CHOICES, default="neutral"),
+            )
+            for model in ("chatlog", "emotionlog") for field in EMOTION_FIELDS
+        ],
+        migrations.RunPython(labels_to_codes, codes_to_labels),
+        # 回滚时重新加回的旧列需要默认值
+        *[
+            migrations.AlterField(
+                model_name="emotionlog",
+                name=f"{field}_label",
+                field=models.CharField(choices=EMOTION_CHOICES, default="neutral", max_length=50),
+            )
+            for field in EMOTION_FIELDS
+        ],
+        *[
+            migrations.RemoveField(model_name=model, name=f"{field}_label")
+            for model in ("chatlog", "emotionlog") for field in EMOTION_FIELDS
+        ],
+        migrations.AlterField(
+            model_name="emotionlog",
+            name="camera_emotion",
+            field=chat.fields.EmotionField(choices=EMOTION_CHOICES),
+        ),
+        migrations.AlterField(
+            model_name="emotionlog",
+            name="text_emotion",
+            field=chat.fields.EmotionField(choices=EMOTION_CHOICES),
+        ),
+
+        # 3. 删除 EmotionLog 上重复的消息原文（回滚时从 chat_log 恢复）
+        migrations.AlterField(
+            model_name="emotionlog",
+            name="user_message",
+            field=models.TextField(default=""),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_user_messages),
+        migrations.RemoveField(model_name="emotionlog", name="user_message"),
+        migrations.RemoveField(model_name="emotionlog", name="raw_text_emotion"),
+    ]
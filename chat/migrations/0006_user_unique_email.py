@@ -0,0 +1,32 @@
+"""
+User.email 非空时唯一（部分唯一索引），邮箱登录只需一次索引查询。
+
+已有重复邮箱时迁移直接失败并列出这些邮箱，需要先人工处理（改邮箱或合并账号），不自动修改用户数据。
+"""
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_emails(apps, schema_editor):
+    User = apps.get_model("chat", "User")
+    duplicates = list(User.objects.exclude(email="").values("email")
+                      .annotate(n=Count("id")).filter(n__gt=1).values_list("email", flat=True)[:20])
+    if duplicates:
+        raise RuntimeError(
+            "Cannot add unique_user_email: these emails belong to more than one user: " + ", ".join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('chat', '0005_compact_emotion_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('email',), name='unique_user_email', violation_error_message='Email already registered'),
+        ),
+    ]
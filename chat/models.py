@@ -3,9 +3,18 @@ from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .fields import EmotionField
+
 class User(AbstractUser):
     avatar = models.ImageField(upload_to="avatars/", default="avatars/default.png", blank=True)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # 登录按邮箱查找（chat.backends.EmailBackend）；允许多个未填邮箱的账号
+            models.UniqueConstraint(fields=["email"], condition=~models.Q(email=""), name="unique_user_email",
+                                    violation_error_message="Email already registered"),
+        ]
+
     def __str__(self):
         return self.username
     
@@ -31,22 +40,28 @@ class ChatSession(models.Model):
 class ChatLog(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
     user_message = models.TextField()
-    camera_emotion = models.CharField(max_length=50, choices=EMOTION_CHOICES, default="neutral")
-    text_emotion = models.CharField(max_length=50, choices=EMOTION_CHOICES, default="neutral")
+    camera_emotion = EmotionField(choices=EMOTION_CHOICES, default="neutral")
+    text_emotion = EmotionField(choices=EMOTION_CHOICES, default="neutral")
     raw_text_emotion = models.CharField(max_length=100, default="neutral")  # ✅ 新增字段
     gpt_response = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["session", "created_at"]),
+        ]
+
     def __str__(self):
         return f"{self.created_at} | {self.user_message[:20]}..."
 
 
+# ✅ 情绪记录指向对应的 ChatLog，消息原文只存一份；情绪存为小整数编码（见 fields.py）
 class EmotionLog(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
-    user_message = models.TextField()
-    camera_emotion = models.CharField(max_length=50, choices=EMOTION_CHOICES)
-    text_emotion = models.CharField(max_length=50, choices=EMOTION_CHOICES)
-    raw_text_emotion = models.CharField(max_length=100, default="neutral")  # ✅ 新增字段
+    chat_log = models.OneToOneField(ChatLog, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name="emotion_log")
+    camera_emotion = EmotionField(choices=EMOTION_CHOICES)
+    text_emotion = EmotionField(choices=EMOTION_CHOICES)
     timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
@@ -56,3 +71,46 @@ class EmotionLog(models.Model):
 
     def __str__(self):
         return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {self.camera_emotion}/{self.text_emotion}"
+
+
+# ✅ 情绪统计汇总表：按 分钟/小时/天 分桶的计数，写 EmotionLog 时增量更新，趋势查询只读这里
+ROLLUP_RESOLUTIONS = [
+    ("minute", "Minute"),
+    ("hour", "Hour"),
+    ("day", "Day"),
+]
+
+ROLLUP_SOURCES = [
+    ("camera", "Camera"),
+    ("text", "Text"),
+]
+
+class EmotionRollup(models.Model):
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=10, choices=ROLLUP_RESOLUTIONS)
+    bucket = models.DateTimeField()  # 桶的起始时间
+    source = models.CharField(max_length=10, choices=ROLLUP_SOURCES)
+    emotion = models.CharField(max_length=50, choices=EMOTION_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["session", "resolution", "bucket", "source", "emotion"],
+                                    name="unique_emotion_rollup_bucket"),
+        ]
+
+    def __str__(self):
+        return f"[{self.resolution} {self.bucket:%Y-%m-%d %H:%M}] {self.source}/{self.emotion} × {self.count}"
+
+
+# ✅ 每个会话摄像头情绪得分的累计统计（Welford 在线算法 + 指数衰减版本），趋势页不再扫描全表
+class EmotionStats(models.Model):
+    session = models.OneToOneField(ChatSession, on_delete=models.CASCADE, related_name="emotion_stats")
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)         # 与均值之差的平方和，样本方差 = m2 / (count - 1)
+    ewma_mean = models.FloatField(default=0.0)  # 指数衰减均值，越近的记录权重越大
+    ewma_var = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return f"{self.session_id}: n={self.count} mean={self.mean:.2f}"
@@ -0,0 +1,63 @@
+"""
+按 (session, 时间, id) 的游标分页（keyset），配合 ChatLog / EmotionLog 上的 (session, 时间) 索引，
+翻到第几页都只扫描一页的行，不用 OFFSET。
+
+游标是 "时间|id" 的 urlsafe base64，对客户端不透明。
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误"""
+
+
+def encode_cursor(moment, pk):
+    raw = f"{moment.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        moment, pk = raw.rsplit("|", 1)
+        moment = parse_datetime(moment)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"invalid cursor: {value}") from e
+    if moment is None:
+        raise InvalidCursor(f"invalid cursor: {value}")
+    return moment, pk
+
+
+def after(queryset, field, cursor):
+    """严格晚于游标的行，按时间升序"""
+    moment, pk = decode_cursor(cursor)
+    # 先给出 >= 的范围条件，便于数据库走索引，再排除同一时刻里 id 不大于游标的行
+    return (queryset.filter(**{f"{field}__gte": moment})
+            .filter(Q(**{f"{field}__gt": moment}) | Q(id__gt=pk))
+            .order_by(field, "id"))
+
+
+def before(queryset, field, cursor=None):
+    """严格早于游标的行（无游标时为全部），按时间降序"""
+    if cursor is not None:
+        moment, pk = decode_cursor(cursor)
+        queryset = (queryset.filter(**{f"{field}__lte": moment})
+                    .filter(Q(**{f"{field}__lt": moment}) | Q(id__lt=pk)))
+    return queryset.order_by(f"-{field}", "-id")
+
+
+def latest_page(queryset, field, limit, cursor=None):
+    """
+    游标之前（或最新）的 limit 行，按时间升序返回 (rows, older_cursor)；
+    older_cursor 为 None 表示没有更早的记录了。
+    """
+    rows = list(before(queryset, field, cursor)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit][::-1]
+    older = encode_cursor(getattr(rows[0], field), rows[0].pk) if has_more else None
+    return rows, older
@@ -0,0 +1,102 @@
+"""
+EmotionLog 的分桶汇总（EmotionRollup）：每个会话按 分钟/小时/天 统计摄像头与文字情绪的次数。
+
+- 新写入的 EmotionLog 通过 post_save 信号增量累加（见 apps.py），每条日志 6 次 UPDATE
+- rebuild() 在数据库里 GROUP BY 重算，供 manage.py rebuild_emotion_rollups 使用
+- query() 只读汇总表，趋势图的开销与桶数成正比，与消息条数无关
+
+桶按 settings.TIME_ZONE 的本地时间截断，与 trend_view 显示的时间一致。
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import EmotionLog, EmotionRollup
+
+RESOLUTIONS = {
+    "minute": (TruncMinute, timedelta(minutes=1)),
+    "hour": (TruncHour, timedelta(hours=1)),
+    "day": (TruncDay, timedelta(days=1)),
+}
+SOURCES = {"camera": "camera_emotion", "text": "text_emotion"}
+
+
+def bucket_start(moment, resolution):
+    """把时间截断到所在桶的起点（本地时区），返回带时区的 datetime"""
+    local = timezone.localtime(moment)
+    if resolution == "minute":
+        local = local.replace(second=0, microsecond=0)
+    elif resolution == "hour":
+        local = local.replace(minute=0, second=0, microsecond=0)
+    else:
+        local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local
+
+
+def _increment(session_id, resolution, bucket, source, emotion):
+    lookup = dict(session_id=session_id, resolution=resolution, bucket=bucket, source=source, emotion=emotion)
+    if EmotionRollup.objects.filter(**lookup).update(count=F("count") + 1):
+        return
+    try:
+        with transaction.atomic():
+            EmotionRollup.objects.create(count=1, **lookup)
+    except IntegrityError:
+        # 并发写入时别的请求已经建好了这一行
+        EmotionRollup.objects.filter(**lookup).update(count=F("count") + 1)
+
+
+def record(log):
+    """把一条新写入的 EmotionLog 计入各粒度的桶"""
+    with transaction.atomic():
+        for resolution in RESOLUTIONS:
+            bucket = bucket_start(log.timestamp, resolution)
+            for source, field in SOURCES.items():
+                _increment(log.session_id, resolution, bucket, source, getattr(log, field))
+
+
+def rebuild(session_id=None, batch_size=1000):
+    """从 EmotionLog 全量重算汇总表（可只重算一个会话），返回写入的行数"""
+    logs = EmotionLog.objects.all()
+    rollups = EmotionRollup.objects.all()
+    if session_id is not None:
+        logs = logs.filter(session_id=session_id)
+        rollups = rollups.filter(session_id=session_id)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for resolution, (trunc, _) in RESOLUTIONS.items():
+            for source, field in SOURCES.items():
+                rows = (logs.annotate(bucket=trunc("timestamp"))
+                        .values("session_id", "bucket", field)
+                        .annotate(n=Count("id"))
+                        .order_by())
+                objs = [EmotionRollup(session_id=row["session_id"], resolution=resolution, bucket=row["bucket"],
+                                      source=source, emotion=row[field], count=row["n"])
+                        for row in rows.iterator()]
+                EmotionRollup.objects.bulk_create(objs, batch_size=batch_size)
+                written += len(objs)
+    return written
+
+
+def query(session_id, resolution, start=None, end=None, using="default"):
+    """
+    读取 [start, end) 范围内的桶，按时间升序返回
+    [{"bucket": datetime, "camera": {emotion: n}, "text": {emotion: n}}, ...]，没有数据的桶不返回。
+    using 为读取的数据库别名（如只读副本）。
+    """
+    rows = EmotionRollup.objects.using(using).filter(session_id=session_id, resolution=resolution)
+    if start is not None:
+        rows = rows.filter(bucket__gte=bucket_start(start, resolution))
+    if end is not None:
+        rows = rows.filter(bucket__lt=end)
+
+    buckets = defaultdict(lambda: {"camera": {}, "text": {}})
+    for bucket, source, emotion, count in rows.order_by("bucket").values_list("bucket", "source", "emotion", "count"):
+        buckets[bucket][source][emotion] = count
+    return [{"bucket": bucket, **counts} for bucket, counts in buckets.items()]
+
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import emotion_stats, rollups
+from .models import EmotionLog
+
+
+# ✅ 每写入一条 EmotionLog，同步累加到分桶汇总表
+@receiver(post_save, sender=EmotionLog, dispatch_uid="chat.emotion_rollup")
+def update_emotion_rollups(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.record(instance)
+
+
+# ✅ 同时更新会话的累计情绪统计（趋势页建议等级）
+@receiver(post_save, sender=EmotionLog, dispatch_uid="chat.emotion_stats")
+def update_emotion_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        emotion_stats.record(instance.session_id, instance.camera_emotion)
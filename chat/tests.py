@@ -1,3 +1,782 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import statistics
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import admission, conversation, emotion_cache, emotion_state, emotion_stats, face_client, gpt_helper, language, llm_client, metrics, pagination, rollups, throttle, vision
+from .keyword_matcher import KeywordMatcher
+from .models import ChatLog, ChatSession, EmotionLog, EmotionRollup, EmotionStats
+
+
+class ParseCombinedTests(SimpleTestCase):
+    def test_plain_json(self):
+        content = '{"emotion": "sad", "reason": "tired", "reply": "I am here."}'
+        self.assertEqual(gpt_helper.parse_combined(content), ("sad", "tired", "I am here."))
+
+    def test_fenced_json(self):
+        content = '```json\n{"emotion": "happy", "reason": "good news", "reply": "Yay!"}\n```'
+        self.assertEqual(gpt_helper.parse_combined(content), ("happy", "good news", "Yay!"))
+
+    def test_surrounding_prose(self):
+        content = 'Sure, here it is: {"emotion": "angry", "reply": " Breathe. "} Hope that helps {x}'
+        self.assertEqual(gpt_helper.parse_combined(content), ("angry", "未提供原因", "Breathe."))
+
+    def test_missing_or_empty_reply(self):
+        self.assertIsNone(gpt_helper.parse_combined('{"emotion": "sad", "reason": "x"}'))
+        self.assertIsNone(gpt_helper.parse_combined('{"emotion": "sad", "reply": "  "}'))
+        self.assertIsNone(gpt_helper.parse_combined('{"emotion": "sad", "reply": 3}'))
+        self.assertIsNone(gpt_helper.parse_combined("no json here"))
+        self.assertIsNone(gpt_helper.parse_combined(None))
+
+    def test_unknown_emotion_becomes_neutral(self):
+        content = '{"emotion": "Bored", "reason": "r", "reply": "ok"}'
+        self.assertEqual(gpt_helper.parse_combined(content), ("neutral", "r", "ok"))
+
+    def test_find_json_object_skips_objects_without_key(self):
+        text = 'first {"a": 1} then {broken then {"reply": "hi", "nested": {"b": 2}}'
+        self.assertEqual(gpt_helper._find_json_object(text, "reply"), {"reply": "hi", "nested": {"b": 2}})
+        self.assertIsNone(gpt_helper._find_json_object('{"a": 1}', "reply"))
+
+    def test_malformed_response_falls_back(self):
+        completion = mock.AsyncMock(return_value={"choices": []})
+        with mock.patch.object(gpt_helper.llm_client, "achat_completion", completion), \
+                mock.patch.object(metrics, "inc") as inc, self.assertLogs("chat.gpt_helper", "WARNING"):
+            self.assertIsNone(async_to_sync(gpt_helper.acombined_response)("hello"))
+        inc.assert_called_once_with("combined_fallbacks_total")
+
+
+class LanguageDetectTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(language, "_clients", language.ClientLanguages())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fallback_is_remembered_per_client(self):
+        self.assertEqual(language.detect("今天好累", "user:1"), "zh")
+        self.assertEqual(language.detect("Estoy un poco cansada, pero está bien.", "user:2"), "es")
+        # 只有表情时区段和 langdetect 都判断不出来，沿用各自上次的结果
+        self.assertEqual(language.detect("😢", "user:1"), "zh")
+        self.assertEqual(language.detect("😢", "user:2"), "es")
+        self.assertEqual(language.detect("😢"), language.DEFAULT)
+
+
+class TrimHistoryTests(SimpleTestCase):
+    def test_budget_comes_from_settings(self):
+        history = [{"user": "x" * 40, "bot": "y" * 40} for _ in range(5)]
+        # 每轮约 2 * (10 + 4) = 28 token
+        with self.settings(PROMPT_HISTORY_TOKEN_BUDGET=60):
+            self.assertEqual(len(gpt_helper.trim_history(history)), 2)
+        with self.settings(PROMPT_HISTORY_TOKEN_BUDGET=1000):
+            self.assertEqual(len(gpt_helper.trim_history(history)), 5)
+        self.assertEqual(gpt_helper.trim_history(history, budget=10), [])
+
+
+class DecodeFrameTests(SimpleTestCase):
+    def test_empty_and_garbage_frames_are_invalid(self):
+        for data in (b"", b"\xff\xd8", b"not an image"):
+            with self.assertRaises(vision.InvalidFrame):
+                vision.decode_bytes(data)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.limiter = throttle.TokenBucketLimiter("default")
+
+    def test_denies_when_empty_and_refills(self):
+        # 容量 2，每秒补充 1 个
+        self.assertEqual(self.limiter.consume("k", 2, 1.0, now=100.0), 0)
+        self.assertEqual(self.limiter.consume("k", 2, 1.0, now=100.0), 0)
+        self.assertAlmostEqual(self.limiter.consume("k", 2, 1.0, now=100.0), 1.0)
+        self.assertAlmostEqual(self.limiter.consume("k", 2, 1.0, now=100.5), 0.5)
+        self.assertEqual(self.limiter.consume("k", 2, 1.0, now=101.5), 0)
+
+    def test_refill_is_capped_at_capacity(self):
+        self.limiter.consume("k", 2, 1.0, now=0.0)
+        for _ in range(2):
+            self.assertEqual(self.limiter.consume("k", 2, 1.0, now=1000.0), 0)
+        self.assertGreater(self.limiter.consume("k", 2, 1.0, now=1000.0), 0)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttle.parse_rate("30/min"), (30, 0.5))
+        self.assertIsNone(throttle.parse_rate(""))
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_CACHE_ALIAS="default",
+                   THROTTLE_RATES={"test": {"user": "1/min", "ip": "1/min"}})
+class ThrottleCheckTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        throttle._limiter = None
+        self.addCleanup(setattr, throttle, "_limiter", None)
+        self.factory = RequestFactory()
+
+    def test_anonymous_requests_use_ip_bucket(self):
+        user = mock.Mock(is_authenticated=False)
+        self.assertIsNone(throttle.check("test", self.factory.get("/", REMOTE_ADDR="10.0.0.1"), user))
+        response = throttle.check("test", self.factory.get("/", REMOTE_ADDR="10.0.0.1"), user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertIsNone(throttle.check("test", self.factory.get("/", REMOTE_ADDR="10.0.0.2"), user))
+
+    def test_authenticated_users_skip_ip_bucket(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        self.assertIsNone(throttle.check("test", request, mock.Mock(is_authenticated=True, pk=1)))
+        self.assertIsNone(throttle.check("test", request, mock.Mock(is_authenticated=True, pk=2)))
+        self.assertEqual(throttle.check("test", request, mock.Mock(is_authenticated=True, pk=1)).status_code, 429)
+
+    def test_async_view(self):
+        @throttle.throttle("test")
+        async def view(request):
+            return "ok"
+
+        def call():
+            request = self.factory.get("/", REMOTE_ADDR="10.0.0.3")
+            request.auser = mock.AsyncMock(return_value=mock.Mock(is_authenticated=False))
+            return async_to_sync(view)(request)
+
+        self.assertEqual(call(), "ok")
+        self.assertEqual(call().status_code, 429)
+
+    def test_client_ip_ignores_forwarded_for_without_trusted_proxy(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(throttle.client_ip(request), "10.0.0.1")
+
+    @override_settings(TRUSTED_PROXIES=["10.0.0.0/8"])
+    def test_client_ip_behind_trusted_proxy(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4, 10.0.0.9")
+        self.assertEqual(throttle.client_ip(request), "1.2.3.4")
+        request = self.factory.get("/", REMOTE_ADDR="5.5.5.5", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(throttle.client_ip(request), "5.5.5.5")
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = ChatSession.objects.create()
+        moment = timezone.now().replace(microsecond=0)
+        # 两两同一时刻，检验 (时间, id) 游标不会漏行或重复
+        cls.logs = [EmotionLog.objects.create(session=cls.session, camera_emotion="happy", text_emotion="sad",
+                                              timestamp=moment + timedelta(seconds=i // 2))
+                    for i in range(5)]
+
+    def test_cursor_round_trip(self):
+        log = self.logs[0]
+        cursor = pagination.encode_cursor(log.timestamp, log.pk)
+        self.assertEqual(pagination.decode_cursor(cursor), (log.timestamp, log.pk))
+        for value in ("", "!!!", "bm90IGEgY3Vyc29y"):
+            with self.assertRaises(pagination.InvalidCursor):
+                pagination.decode_cursor(value)
+
+    def test_pages_backwards_and_forwards(self):
+        logs = EmotionLog.objects.filter(session=self.session)
+        ids, cursor = [], None
+        while True:
+            page, cursor = pagination.latest_page(logs, "timestamp", 2, cursor)
+            ids = [log.pk for log in page] + ids
+            if cursor is None:
+                break
+        self.assertEqual(ids, [log.pk for log in self.logs])
+
+        since = pagination.encode_cursor(self.logs[1].timestamp, self.logs[1].pk)
+        self.assertEqual([log.pk for log in pagination.after(logs, "timestamp", since)],
+                         [log.pk for log in self.logs[2:]])
+
+    def test_trend_etag(self):
+        user = get_user_model().objects.create_user("etag", "etag@example.com", "pw")
+        self.client.force_login(user)
+        url = reverse("trend_data", args=[self.session.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        EmotionLog.objects.create(session=self.session, camera_emotion="sad", text_emotion="sad",
+                                  timestamp=self.logs[-1].timestamp + timedelta(seconds=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(TIME_ZONE="Asia/Shanghai")
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = ChatSession.objects.create()
+        # 本地时间跨分钟、小时、天的边界
+        midnight = timezone.make_aware(datetime(2026, 3, 2))
+        cls.offsets = [-3601, -61, -60, -1, 0, 1, 59, 60, 3599, 3600]
+        emotions = ["happy", "sad", "sad", "angry", "happy", "fear", "neutral", "sad", "happy", "surprise"]
+        for offset, emotion in zip(cls.offsets, emotions):
+            EmotionLog.objects.create(session=cls.session, camera_emotion=emotion, text_emotion="neutral",
+                                      timestamp=midnight + timedelta(seconds=offset))
+        cls.midnight = midnight
+
+    def _snapshot(self):
+        return sorted(EmotionRollup.objects.filter(session=self.session)
+                      .values_list("resolution", "bucket", "source", "emotion", "count"))
+
+    def test_incremental_rows_match_rebuild(self):
+        incremental = self._snapshot()
+        self.assertEqual(sum(row[4] for row in incremental), len(self.offsets) * 2 * len(rollups.RESOLUTIONS))
+        rollups.rebuild(self.session.id)
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_buckets_use_local_time(self):
+        days = rollups.query(self.session.id, "day")
+        self.assertEqual([timezone.localtime(b["bucket"]).date().isoformat() for b in days], ["2026-03-01", "2026-03-02"])
+        self.assertEqual(sum(days[0]["camera"].values()), 4)
+        hours = rollups.query(self.session.id, "hour")
+        self.assertEqual([timezone.localtime(b["bucket"]).hour for b in hours], [22, 23, 0, 1])
+
+    def test_rollup_view_shape_and_range(self):
+        self.client.force_login(get_user_model().objects.create_user("rollups", "rollups@example.com", "pw"))
+        start, end = self.midnight - timedelta(minutes=1), self.midnight + timedelta(minutes=1)
+        response = self.client.get(reverse("trend_rollup", args=[self.session.id]),
+                                   {"resolution": "minute", "start": start.isoformat(), "end": end.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["resolution"], "minute")
+        # [start, end)：23:59 与 00:00 两个桶，00:01 的记录不在范围内
+        self.assertEqual([bucket["bucket"] for bucket in body["buckets"]],
+                         ["2026-03-01T23:59:00+08:00", "2026-03-02T00:00:00+08:00"])
+        self.assertEqual(body["buckets"][0], {"bucket": "2026-03-01T23:59:00+08:00",
+                                              "camera": {"sad": 1, "angry": 1}, "text": {"neutral": 2}})
+        self.assertEqual(body["buckets"][1]["camera"], {"happy": 1, "fear": 1, "neutral": 1})
+
+
+class TrendRollupEtagTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+        self.client.force_login(get_user_model().objects.create_user("rollup", "rollup@example.com", "pw"))
+        self.url = reverse("trend_rollup", args=[self.session.id])
+
+    def _get(self, now, **params):
+        with mock.patch("chat.views.timezone.now", return_value=now):
+            return self.client.get(self.url, {"resolution": "minute", **params})
+
+    def test_default_window_etag_follows_the_current_bucket(self):
+        now = timezone.now().replace(second=10, microsecond=0)
+        first = self._get(now)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["ETag"], self._get(now + timedelta(seconds=30))["ETag"])
+
+        later = self._get(now + timedelta(minutes=1))
+        self.assertNotEqual(first["ETag"], later["ETag"])
+        self.assertNotEqual(first.json()["end"], later.json()["end"])
+
+    def test_explicit_range_and_resolution_are_part_of_etag(self):
+        now = timezone.now()
+        etags = {self._get(now)["ETag"], self._get(now, resolution="hour")["ETag"],
+                 self._get(now, start=(now - timedelta(minutes=5)).isoformat())["ETag"]}
+        self.assertEqual(len(etags), 3)
+
+    def test_invalid_range(self):
+        response = self._get(timezone.now(), resolution="week")
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("ETag", response)
+
+
+@override_settings(CONVERSATION_BACKEND="cache", CONVERSATION_CACHE_ALIAS="default",
+                   CONVERSATION_WINDOW_TURNS=2, CONVERSATION_KEEP_TURNS=1)
+class ConversationStoreTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        conversation._store = None
+        self.addCleanup(setattr, conversation, "_store", None)
+
+    def test_window_is_seeded_from_chat_log_and_appended(self):
+        session = ChatSession.objects.create()
+        ChatLog.objects.create(session=session, user_message="hi", gpt_response="hello")
+        self.assertIsInstance(conversation.get_store(), conversation.CacheConversationStore)
+
+        window = async_to_sync(conversation.aget_window)(session.id)
+        self.assertEqual([(t["user"], t["bot"]) for t in window["turns"]], [("hi", "hello")])
+
+        with mock.patch.object(conversation, "schedule_summary") as schedule:
+            async_to_sync(conversation.aappend)(session.id, "how are you", "good")
+            schedule.assert_not_called()
+            async_to_sync(conversation.aappend)(session.id, "bye", "see you")
+            schedule.assert_called_once_with(session.id)
+        window = async_to_sync(conversation.aget_window)(session.id)
+        self.assertEqual([t["user"] for t in window["turns"]], ["hi", "how are you", "bye"])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(llm_client.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = llm_client.CircuitBreaker(threshold=2, cooldown=10)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_allows_one_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 10
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.now += 9
+        self.assertFalse(self.breaker.allow())
+
+    def test_abandoned_probe_is_replaced_after_cooldown(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.now += 5
+        self.assertFalse(self.breaker.allow())
+        self.now += 6
+        self.assertTrue(self.breaker.allow())
+
+    def test_release_ends_probe_without_closing(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())
+
+
+class LLMClientRetryTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = llm_client.CircuitBreaker(threshold=5, cooldown=30)
+        self.calls = 0
+        self.outcomes = []
+        client = httpx.Client(transport=httpx.MockTransport(self._handle))
+        self.addCleanup(client.close)
+        for name, value in (("breaker", self.breaker), ("_backoff", lambda attempt: 0), ("_sync_client", client)):
+            patcher = mock.patch.object(llm_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _handle(self, request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"choices": [{"message": {"content": "hi"}}]})
+
+    def test_connect_errors_and_5xx_are_retried(self):
+        self.outcomes = [httpx.ConnectError("refused"), 503, 200]
+        self.assertEqual(llm_client.chat_completion({})["choices"][0]["message"]["content"], "hi")
+        self.assertEqual((self.calls, self.breaker.failures), (3, 0))
+
+    def test_read_timeout_is_not_retried(self):
+        self.outcomes = [httpx.ReadTimeout("slow"), 200]
+        with self.assertRaises(llm_client.LLMError):
+            llm_client.chat_completion({})
+        self.assertEqual((self.calls, self.breaker.failures), (1, 1))
+
+    def test_client_errors_do_not_count_as_failures(self):
+        self.outcomes = [400]
+        with self.assertRaises(llm_client.LLMError):
+            llm_client.chat_completion({})
+        self.assertEqual((self.calls, self.breaker.failures), (1, 0))
+
+    def test_exhausted_retries_count_once(self):
+        self.outcomes = [429, 502, 500]
+        with self.assertRaises(llm_client.LLMError):
+            llm_client.chat_completion({})
+        self.assertEqual((self.calls, self.breaker.failures), (3, 1))
+
+
+class FaceWorkerConfigTests(SimpleTestCase):
+    def test_only_local_addresses(self):
+        for address in ("127.0.0.1:6010", "localhost:6010", "[::1]:6010", ":6010", "/run/face.sock"):
+            self.assertTrue(face_client.is_local_address(face_client.parse_address(address)), address)
+        for address in ("0.0.0.0:6010", "10.0.0.5:6010", "face-worker:6010"):
+            self.assertFalse(face_client.is_local_address(face_client.parse_address(address)), address)
+
+    def test_authkey_is_required(self):
+        for authkey in ("", "short"):
+            with self.settings(FACE_WORKER_AUTHKEY=authkey), self.assertRaises(ImproperlyConfigured):
+                face_client.get_authkey()
+        with self.settings(FACE_WORKER_AUTHKEY="x" * 32):
+            self.assertEqual(face_client.get_authkey(), b"x" * 32)
+
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN="t0ken", DEBUG=False)
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer nope").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer t0ken")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    @override_settings(METRICS_TOKEN="", METRICS_ALLOWED_IPS=["127.0.0.1"], TRUSTED_PROXIES=["127.0.0.1"])
+    def test_ip_allowlist_only_in_debug(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+            # 经过代理转发的外部请求不能借代理的地址通过
+            self.assertEqual(self.client.get("/metrics", HTTP_X_FORWARDED_FOR="8.8.8.8").status_code, 403)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class DetectEmotionViewTests(TestCase):
+    def setUp(self):
+        import cv2
+        import numpy as np
+
+        self.jpeg = cv2.imencode(".jpg", np.full((48, 64, 3), 128, dtype=np.uint8))[1].tobytes()
+        faces = [{"box": [0, 0, 10, 10], "emotions": {"happy": 0.8, "sad": 0.2}}]
+        for name, value in (("camera_enabled", lambda: True), ("detect_emotions", lambda img: faces)):
+            patcher = mock.patch.object(vision, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _post(self, data):
+        return await self.async_client.post(reverse("detect_emotion"),
+                                            {"frame": SimpleUploadedFile("frame.jpg", data, "image/jpeg")})
+
+    async def test_frame_is_analyzed(self):
+        response = await self._post(self.jpeg)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["emotion"], "happy")
+        self.assertIn("decode_ms", body["timing"])
+
+    async def test_empty_frame_is_rejected(self):
+        self.assertEqual((await self._post(b"")).status_code, 400)
+
+    @override_settings(FRAME_MAX_BYTES=1000)
+    async def test_oversized_frame_is_rejected_before_parsing(self):
+        with mock.patch("django.core.files.uploadhandler.TemporaryFileUploadHandler.new_file") as new_file, \
+                mock.patch.object(vision, "decode_frame") as decode_frame:
+            response = await self._post(b"\xff\xd8" + b"0" * 50000)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("larger than 1000", response.json()["error"])
+            # Content-Length 只超出一点时由上传处理器在内存里截断
+            with mock.patch.object(vision, "UPLOAD_OVERHEAD", 10 ** 6):
+                response = await self._post(b"\xff\xd8" + b"0" * 50000)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("larger than 1000", response.json()["error"])
+        new_file.assert_not_called()
+        decode_frame.assert_not_called()
+
+    async def test_overloaded_gate_returns_503(self):
+        gate = admission.Gate("inference", limit=0, max_queue=0, timeout=1)
+        with mock.patch.object(admission, "inference_gate", lambda: gate):
+            response = await self._post(self.jpeg)
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(THROTTLE_ENABLED=False, TEXT_EMOTION_MODE="llm", CHAT_RESPONSE_MODE="separate",
+                   CONVERSATION_CACHE_ALIAS="default", EMOTION_STATE_CACHE_ALIAS="default")
+class ChatApiViewTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        for module in (conversation, emotion_state):
+            module._store = None
+            self.addCleanup(setattr, module, "_store", None)
+        emotion_cache._local = None
+        self.addCleanup(setattr, emotion_cache, "_local", None)
+        self.session = ChatSession.objects.create()
+
+    def _fake_llm(self):
+        """情绪分类和回复两个请求都到达后才一起返回，串行调用会超时"""
+        calls = []
+        both_started = asyncio.Event()
+
+        async def achat_completion(payload, **kwargs):
+            calls.append(payload)
+            if len(calls) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), timeout=2)
+            if payload["temperature"] == 0.2:
+                content = '{"emotion": "sad", "reason": "low mood"}'
+            else:
+                content = " a reply "
+            return {"choices": [{"message": {"content": content}}]}
+
+        return calls, achat_completion
+
+    async def _post(self, message):
+        return await self.async_client.post(reverse("chat_api", args=[self.session.id]),
+                                            {"message": message, "emotion": "neutral"},
+                                            content_type="application/json")
+
+    async def test_reply_emotion_care_and_log(self):
+        calls, fake = self._fake_llm()
+        with mock.patch.object(llm_client, "achat_completion", fake):
+            response = await self._post("the weather today")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        body = response.json()
+        self.assertEqual(set(body), {"response", "camera_emotion", "text_emotion", "reason", "language"})
+        self.assertEqual(body["text_emotion"], "sad")
+        self.assertEqual(body["reason"], "low mood")
+        self.assertEqual(body["response"], "Are you okay? Want to talk?\n\na reply")
+
+        chat_log = await ChatLog.objects.select_related("emotion_log").aget(session=self.session)
+        self.assertEqual(chat_log.gpt_response, body["response"])
+        self.assertEqual(chat_log.emotion_log.text_emotion, "sad")
+        self.assertEqual(await EmotionLog.objects.acount(), 1)
+
+        # 冷却期内不再重复关心
+        calls, fake = self._fake_llm()
+        with mock.patch.object(llm_client, "achat_completion", fake):
+            response = await self._post("the weather tomorrow")
+        self.assertEqual(response.json()["response"], "a reply")
+        self.assertEqual(await ChatLog.objects.acount(), 2)
+
+    async def test_language_cache_is_per_client(self):
+        # 三个动物会话所有人共用，语言缓存不能按 ChatSession 记
+        calls, fake = self._fake_llm()
+        with mock.patch.object(llm_client, "achat_completion", fake), \
+                mock.patch("chat.views._detect_language", return_value="en") as detect:
+            await self._post("the weather today")
+            user = await get_user_model().objects.acreate_user("lang", "lang@example.com", "pw")
+            await self.async_client.aforce_login(user)
+            await self._post("the weather today")
+        self.assertEqual([c.args[1] for c in detect.call_args_list], ["ip:127.0.0.1", f"user:{user.pk}"])
+
+
+@override_settings(THROTTLE_ENABLED=False, TEXT_EMOTION_MODE="llm",
+                   CONVERSATION_CACHE_ALIAS="default", EMOTION_STATE_CACHE_ALIAS="default")
+class ChatStreamViewTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        for module in (conversation, emotion_state):
+            module._store = None
+            self.addCleanup(setattr, module, "_store", None)
+        emotion_cache._local = None
+        self.addCleanup(setattr, emotion_cache, "_local", None)
+        self.session = ChatSession.objects.create()
+        completion = mock.AsyncMock(return_value={
+            "choices": [{"message": {"content": '{"emotion": "sad", "reason": "low mood"}'}}]})
+        patcher = mock.patch.object(llm_client, "achat_completion", completion)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _stream(self, chunks, error=None):
+        async def astream_chat_completion(payload, **kwargs):
+            for chunk in chunks:
+                yield chunk
+            if error is not None:
+                raise error
+
+        with mock.patch.object(llm_client, "astream_chat_completion", astream_chat_completion):
+            response = await self.async_client.post(reverse("chat_stream_api", args=[self.session.id]),
+                                                    {"message": "the weather today", "emotion": "neutral"},
+                                                    content_type="application/json")
+            body = b"".join([part async for part in response.streaming_content]).decode()
+        events = []
+        for block in body.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    async def test_tokens_then_care_then_done(self):
+        events = await self._stream(["Hel", "lo ", "there "])
+        self.assertEqual([name for name, _ in events], ["token", "token", "token", "care", "done"])
+        self.assertEqual([data["text"] for _, data in events[:3]], ["Hel", "lo ", "there "])
+        care = events[3][1]["text"]
+        self.assertEqual(care, "Are you okay? Want to talk?")
+
+        done = events[4][1]
+        self.assertEqual(done["response"], care + "\n\nHello there")
+        self.assertEqual(done["text_emotion"], "sad")
+        chat_log = await ChatLog.objects.aget(session=self.session)
+        self.assertEqual(chat_log.gpt_response, care + "\n\n" + "".join(["Hel", "lo ", "there "]).strip())
+
+    async def test_failure_after_output_does_not_append_fallback(self):
+        with self.assertLogs("chat.gpt_helper", "WARNING"):
+            events = await self._stream(["Hel", "lo"], error=llm_client.LLMError("connection reset"))
+        tokens = [data["text"] for name, data in events if name == "token"]
+        self.assertEqual(tokens, ["Hel", "lo"])
+        self.assertNotIn(gpt_helper.FALLBACK_REPLY, tokens)
+        chat_log = await ChatLog.objects.aget(session=self.session)
+        self.assertNotIn(gpt_helper.FALLBACK_REPLY, chat_log.gpt_response)
+        self.assertTrue(chat_log.gpt_response.endswith("Hello"))
+
+    async def test_failure_before_output_yields_fallback(self):
+        with self.assertLogs("chat.gpt_helper", "WARNING"):
+            events = await self._stream([], error=llm_client.LLMError("connection refused"))
+        self.assertEqual([data["text"] for name, data in events if name == "token"], [gpt_helper.FALLBACK_REPLY])
+
+
+class CacheEmotionStoreTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_alert_counts_across_workers(self):
+        # 两个实例模拟两个 worker，同一用户的帧轮流落到不同进程
+        workers = [emotion_state.CacheEmotionStore("default"), emotion_state.CacheEmotionStore("default")]
+        alerts = [workers[i % 2].record_detection("user:1", "sad") for i in range(3)]
+        self.assertEqual(alerts, [False, False, True])
+        self.assertEqual([emotion for _, emotion in workers[0].recent("user:1")], ["sad"] * 3)
+
+    def test_claim_care_once_per_cooldown(self):
+        store = emotion_state.CacheEmotionStore("default")
+        self.assertTrue(async_to_sync(store.aclaim_care)("user:1"))
+        self.assertFalse(async_to_sync(store.aclaim_care)("user:1"))
+        self.assertFalse(store.claim_care("user:1"))
+
+    @override_settings(TRUSTED_PROXIES=["10.0.0.0/8"])
+    def test_anonymous_key_uses_client_ip_behind_proxy(self):
+        factory = RequestFactory()
+        keys = []
+        for client in ("1.2.3.4", "5.6.7.8"):
+            request = factory.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=client)
+            request.session = mock.Mock(session_key=None)
+            keys.append(emotion_state._anonymous_key(request))
+        self.assertEqual(keys, ["ip:1.2.3.4", "ip:5.6.7.8"])
+
+
+class KeywordMatcherNegationTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = KeywordMatcher(
+            {"happy": {"happy": 1.0, "开心": 1.0}, "sad": {"sad": 1.0}, "angry": {"furious": 1.0}},
+            negations={"en": ["not", "never"], "zh": ["不"]},
+            negation_flip={"happy": "sad"},
+        )
+
+    def test_negated_term_is_flipped_with_half_weight(self):
+        self.assertEqual(self.matcher.matches("I'm not happy"), [("happy", "sad", 0.5, True)])
+        self.assertEqual(self.matcher.matches("今天不开心"), [("开心", "sad", 0.5, True)])
+        self.assertEqual(self.matcher.best("I am not happy"), "sad")
+
+    def test_contractions_and_window(self):
+        self.assertTrue(self.matcher.matches("I don't feel happy")[0][3])
+        # 否定词离情绪词超过 3 个词不算
+        self.assertFalse(self.matcher.matches("not that I would say I am happy")[0][3])
+
+    def test_negation_stops_at_clause_break(self):
+        hits = self.matcher.matches("not happy, I'm furious")
+        self.assertEqual([(term, emotion, negated) for term, emotion, _, negated in hits],
+                         [("happy", "sad", True), ("furious", "angry", False)])
+
+    def test_unflipped_emotion_becomes_neutral(self):
+        self.assertEqual(self.matcher.matches("never sad")[0][1], "neutral")
+
+
+class EmotionFieldTests(TestCase):
+    def test_round_trip(self):
+        session = ChatSession.objects.create()
+        log = ChatLog.objects.create(session=session, user_message="hi", camera_emotion="fear",
+                                     text_emotion="happy", gpt_response="hello")
+        log.refresh_from_db()
+        self.assertEqual((log.camera_emotion, log.text_emotion), ("fear", "happy"))
+        self.assertEqual(list(ChatLog.objects.filter(camera_emotion="fear").values_list("text_emotion", flat=True)),
+                         ["happy"])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT camera_emotion FROM {ChatLog._meta.db_table} WHERE id = %s", [log.pk])
+            self.assertEqual(cursor.fetchone()[0], 4)
+
+    def test_unknown_label_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ChatLog.objects.filter(camera_emotion="bored").exists()
+
+
+class EmailBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("alice", "alice@example.com", "s3cret-pass")
+
+    def test_authenticate_by_email(self):
+        self.assertEqual(authenticate(email="alice@example.com", password="s3cret-pass"), self.user)
+        self.assertIsNone(authenticate(email="alice@example.com", password="wrong"))
+        self.assertIsNone(authenticate(email="nobody@example.com", password="s3cret-pass"))
+        self.assertIsNone(authenticate(email="", password="s3cret-pass"))
+
+    def test_inactive_user_cannot_log_in(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(email="alice@example.com", password="s3cret-pass"))
+
+    def test_login_view(self):
+        response = self.client.post(reverse("login"), {"email": "alice@example.com", "password": "s3cret-pass"})
+        self.assertRedirects(response, reverse("session_list"), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session["_auth_user_id"]), self.user.pk)
+
+        self.client.logout()
+        response = self.client.post(reverse("login"), {"email": "alice@example.com", "password": "nope"})
+        self.assertContains(response, "Invalid email or password")
+
+
+@override_settings(EMOTION_STATS_ALPHA=0.1)
+class EmotionStatsTests(TestCase):
+    FIELDS = ("count", "mean", "m2", "ewma_mean", "ewma_var")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = ChatSession.objects.create()
+        rng = random.Random(0)
+        emotions = [rng.choice(list(emotion_stats.EMOTION_SCORES)) for _ in range(200)]
+        start = timezone.now()
+        # post_save 信号逐条用 F 表达式更新 EmotionStats
+        for i, emotion in enumerate(emotions):
+            EmotionLog.objects.create(session=cls.session, camera_emotion=emotion, text_emotion="neutral",
+                                      timestamp=start + timedelta(seconds=i))
+        cls.scores = [emotion_stats.EMOTION_SCORES[e] for e in emotions]
+
+    def _row(self):
+        stats = EmotionStats.objects.get(session=self.session)
+        return {field: getattr(stats, field) for field in self.FIELDS}
+
+    def test_incremental_update_matches_statistics(self):
+        count, mean, std_dev = emotion_stats.summarize(EmotionStats.objects.get(session=self.session), "all")
+        self.assertEqual(count, len(self.scores))
+        self.assertAlmostEqual(mean, statistics.mean(self.scores), places=9)
+        self.assertAlmostEqual(std_dev, statistics.stdev(self.scores), places=9)
+
+    def test_incremental_update_matches_running_stats(self):
+        running = emotion_stats.RunningStats(alpha=0.1)
+        for score in self.scores:
+            running.add(score)
+        _, ewma_mean, ewma_std = emotion_stats.summarize(EmotionStats.objects.get(session=self.session), "recent")
+        self.assertAlmostEqual(ewma_mean, running.ewma_mean, places=9)
+        self.assertAlmostEqual(ewma_std, emotion_stats.summarize(running, "recent")[2], places=9)
+
+    def test_backfill_reproduces_stored_row(self):
+        incremental = self._row()
+        EmotionStats.objects.filter(session=self.session).update(count=0, mean=0, m2=0, ewma_mean=0, ewma_var=0)
+        self.assertEqual(emotion_stats.backfill(self.session.id), 1)
+        rebuilt = self._row()
+        self.assertEqual(rebuilt["count"], incremental["count"])
+        for field in self.FIELDS[1:]:
+            self.assertAlmostEqual(rebuilt[field], incremental[field], places=9, msg=field)
+
+    def test_summarize_empty(self):
+        self.assertEqual(emotion_stats.summarize(None), (0, 0.0, 0.0))
@@ -0,0 +1,142 @@
+"""
+按用户和按 IP 的令牌桶限流，状态存在 THROTTLE_CACHE_ALIAS 指定的 Django cache（默认 shared，同机多 worker 共享）。
+
+    @throttle("chat")
+    async def chat_api(request, session_id): ...
+
+桶的容量与补充速度来自 settings.THROTTLE_RATES[scope]，如 {"user": "20/min", "ip": "60/min"}：
+容量 20，每分钟补满 20 个。登录用户只检查用户桶，未登录的请求只检查 IP 桶（见 client_ip）。
+桶空了直接返回 429 和 Retry-After，不解析请求体、不进入视图。
+读改写不是原子的，并发时偶尔多放行一两个请求，可以接受。
+异步视图的检查放到线程池里执行，文件缓存的读写不阻塞事件循环。
+"""
+import functools
+import ipaddress
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from . import metrics
+
+PERIODS = {"s": 1, "sec": 1, "min": 60, "m": 60, "hour": 3600, "h": 3600, "day": 86400, "d": 86400}
+
+
+def parse_rate(rate):
+    """"20/min" → (容量 20, 每秒补充 20/60)；None 或空字符串表示不限"""
+    if not rate:
+        return None
+    count, _, period = rate.partition("/")
+    count = int(count)
+    return count, count / PERIODS[period.strip()]
+
+
+class TokenBucketLimiter:
+    def __init__(self, alias):
+        self.alias = alias
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        """取一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        now = time.time() if now is None else now
+        cache = caches[self.alias]
+        with self._lock:
+            tokens, updated = cache.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_rate
+            cache.set(key, (tokens, now), timeout=math.ceil(capacity / refill_rate) + 1)
+        return wait
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucketLimiter(settings.THROTTLE_CACHE_ALIAS)
+    return _limiter
+
+
+@functools.lru_cache(maxsize=8)
+def _networks(proxies):
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+
+def _trusted(address, networks):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(request):
+    """
+    客户端 IP。只有 REMOTE_ADDR 属于 settings.TRUSTED_PROXIES（IP 或网段）时才看 X-Forwarded-For：
+    从右往左跳过受信任的代理，第一个不受信任的地址就是客户端；没配置代理时直接用 REMOTE_ADDR，
+    客户端自己伪造的 X-Forwarded-For 不起作用。
+    """
+    remote = request.META.get("REMOTE_ADDR", "")
+    networks = _networks(tuple(settings.TRUSTED_PROXIES))
+    if not networks or not _trusted(remote, networks):
+        return remote
+    forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+    for ip in reversed(forwarded):
+        if not _trusted(ip, networks):
+            return ip
+    return forwarded[0] if forwarded else remote
+
+
+def _idents(request, user):
+    if user is not None and user.is_authenticated:
+        return [("user", user.pk)]
+    return [("ip", client_ip(request))]
+
+
+def check(scope, request, user):
+    """检查用户桶（已登录）或 IP 桶；被限流时返回 429 响应，否则返回 None"""
+    if not settings.THROTTLE_ENABLED:
+        return None
+    rates = settings.THROTTLE_RATES.get(scope, {})
+    limiter = get_limiter()
+    for kind, ident in _idents(request, user):
+        rate = parse_rate(rates.get(kind))
+        if rate is None:
+            continue
+        wait = limiter.consume(f"throttle:{scope}:{kind}:{ident}", *rate)
+        if wait:
+            metrics.inc("throttled_total", scope=scope, kind=kind)
+            response = JsonResponse({"error": "rate limited", "retry_after": math.ceil(wait)}, status=429)
+            response["Retry-After"] = str(max(1, math.ceil(wait)))
+            return response
+    return None
+
+
+def throttle(scope):
+    """视图装饰器，同步/异步视图都适用"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                limited = await sync_to_async(check, thread_sensitive=False)(scope, request, await request.auser())
+                if limited is not None:
+                    return limited
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                limited = check(scope, request, request.user)
+                if limited is not None:
+                    return limited
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
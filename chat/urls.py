@@ -3,8 +3,9 @@ from . import views
 from .views import (
     login_view, register_view, logout_view, 
     session_list_view,
-    chat_view, chat_api, detect_emotion,
-    trend_view, trend_page_view  # ✅ 确保引入了 trend_page_view
+    chat_view, chat_history_view, chat_api, chat_stream_api, detect_emotion,
+    trend_view, trend_rollup_view, trend_page_view,  # ✅ 确保引入了 trend_page_view
+    metrics_view,
 )
 
 urlpatterns = [
@@ -18,7 +19,9 @@ urlpatterns = [
 
     # ✅ 聊天页面
     path('chat/<int:session_id>/', chat_view, name='chat_page'),
+    path('chat/<int:session_id>/history/', chat_history_view, name='chat_history'),
     path('chat/<int:session_id>/send/', chat_api, name='chat_api'),
+    path('chat/<int:session_id>/stream/', chat_stream_api, name='chat_stream_api'),
 
     # ✅ 摄像头检测情绪接口
     path('detect-emotion/', detect_emotion, name='detect_emotion'),
@@ -26,6 +29,12 @@ urlpatterns = [
     # ✅ 情绪趋势数据接口（返回 JSON）
     path('trend/<int:session_id>/data/', trend_view, name='trend_data'),
 
+    # ✅ 分桶趋势数据（?resolution=minute|hour|day&start=...&end=...，只读汇总表）
+    path('trend/<int:session_id>/rollup/', trend_rollup_view, name='trend_rollup'),
+
     # ✅ 情绪趋势图页面（渲染 trend.html）
     path('trend/<int:session_id>/page/', trend_page_view, name='trend_page'),
+
+    # ✅ Prometheus 指标（文本格式）
+    path('metrics', metrics_view, name='metrics'),
 ]
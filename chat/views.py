@@ -1,36 +1,30 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate, login, logout
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from django.db import transaction
+from asgiref.sync import sync_to_async
 from .forms import RegisterForm, LoginForm
 
-import json, os, requests, cv2
-import numpy as np
-from PIL import Image
-from fer import FER
-from langdetect import detect
+import asyncio, hmac, json, logging, time
 from .models import ChatSession, ChatLog, EmotionLog
-from .gpt_helper import generate_response
-from datetime import datetime
-from django.utils.timezone import make_aware, is_naive
+from .gpt_helper import acombined_response, agenerate_response, astream_response
+from . import admission, conversation, emotion_cache, emotion_state, emotion_stats, frame_skip, llm_client, local_emotion, metrics, pagination, rollups, vision
+from .keyword_matcher import get_matcher
+from .language import detect as _detect_language
+from .throttle import client_ip, throttle
 
 User = get_user_model()
+log = logging.getLogger(__name__)
 
-# ✅ 表情分析器
-emotion_detector = FER()
+# ✅ 表情分析器按需加载，见 chat/vision.py
 VALID_EMOTIONS = ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]
-EMOTION_KEYWORDS = {
-    "happy": ["开心", "高兴", "快乐", "幸福", "happy", "joyful", "excited"],
-    "sad": ["伤心", "难过", "悲伤", "sad", "unhappy", "depressed"],
-    "angry": ["生气", "愤怒", "angry", "mad", "furious"],
-    "surprise": ["惊讶", "惊喜", "wow", "omg", "surprised"],
-    "fear": ["害怕", "恐惧", "担心", "fear", "afraid", "anxious"],
-    "disgust": ["恶心", "讨厌", "厌恶", "disgust", "gross"],
-    "neutral": ["嗯", "好", "ok", "normal", "fine"]
-}
 
 # ✅ 注册视图
 def register_view(request):
@@ -45,6 +39,10 @@ def register_view(request):
                 password=form.cleaned_data['password']
             )
             return redirect('login')
+        # ✅ 邮箱已被注册（unique_user_email）等表单级错误
+        errors = form.non_field_errors()
+        if errors:
+            return render(request, 'register.html', {'form': form, 'error': errors[0]})
     else:
         form = RegisterForm()
     return render(request, 'register.html', {'form': form})
@@ -54,16 +52,11 @@ def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request.POST)
         if form.is_valid():
-            email = form.cleaned_data['email']
-            password = form.cleaned_data['password']
-            try:
-                user = User.objects.get(email=email)
-                user = authenticate(request, username=user.username, password=password)
-                if user:
-                    login(request, user)
-                    return redirect('session_list')
-            except User.DoesNotExist:
-                pass
+            # ✅ 按邮箱认证只查一次用户表，见 chat/backends.py
+            user = authenticate(request, email=form.cleaned_data['email'], password=form.cleaned_data['password'])
+            if user:
+                login(request, user)
+                return redirect('session_list')
         return render(request, 'login.html', {'form': form, 'error': 'Invalid email or password'})
     else:
         form = LoginForm()
@@ -75,48 +68,96 @@ def logout_view(request):
     return redirect('login')
 
 # ✅ 辅助函数
-def detect_language(text):
-    try:
-        return detect(text)
-    except:
-        return "en"
+def detect_language(text, client=None):
+    # 先按字符区段判断，判断不出来再用该客户端的缓存 / langdetect，见 chat/language.py
+    return _detect_language(text, client)
 
 def local_emotion_correction(text, gpt_emotion):
-    text_lower = text.lower()
-    for emotion, keywords in EMOTION_KEYWORDS.items():
-        if any(word in text or word in text_lower for word in keywords):
-            return emotion
-    return gpt_emotion
+    # 关键词命中时以加权得分最高的情绪为准（词表见 chat/data/emotion_keywords.json）
+    return get_matcher().best(text) or gpt_emotion
 
-def analyze_text_emotion(text):
-    try:
-        prompt = f"""请判断用户话语属于以下情绪之一：
+def _text_emotion_payload(text):
+    prompt = f"""请判断用户话语属于以下情绪之一：
 ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]。
 输出 JSON：{{"emotion":"<emotion>","reason":"<简要原因>"}}。
 用户输入: "{text}" """
+    return {
+        "model": "meta-llama/llama-3-8b-instruct",
+        "messages": [
+            {"role": "system", "content": "你是情绪分析助手，严格输出 JSON"},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.2
+    }
 
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "meta-llama/llama-3-8b-instruct",
-                "messages": [
-                    {"role": "system", "content": "你是情绪分析助手，严格输出 JSON"},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.2
-            }
-        )
-        result = response.json()
-        data = json.loads(result["choices"][0]["message"]["content"])
-        gpt_emotion = data.get("emotion", "neutral").lower()
-        reason = data.get("reason", "未提供原因")
-        return gpt_emotion if gpt_emotion in VALID_EMOTIONS else "neutral", reason
-    except:
-        return "neutral", "分析失败"
+def _parse_text_emotion(result):
+    data = json.loads(result["choices"][0]["message"]["content"])
+    gpt_emotion = data.get("emotion", "neutral").lower()
+    reason = data.get("reason", "未提供原因")
+    return gpt_emotion if gpt_emotion in VALID_EMOTIONS else "neutral", reason
+
+# 情绪分类只输出一小段 JSON，读取超时比生成回复短得多
+TEXT_EMOTION_READ_TIMEOUT = 10
+
+def _local_text_emotion(text):
+    """
+    按 TEXT_EMOTION_MODE 先用本地分类器：local 模式直接采用；hybrid 模式置信度达标才采用。
+    返回 None 表示需要调用 LLM。
+    """
+    mode = getattr(settings, "TEXT_EMOTION_MODE", "hybrid")
+    if mode == "llm":
+        return None
+    emotion, confidence = local_emotion.classify(text)
+    if mode == "local" or confidence >= getattr(settings, "TEXT_EMOTION_CONFIDENCE_THRESHOLD", 0.7):
+        return emotion, f"本地分类（置信度 {confidence:.2f}）"
+    return None
+
+def _text_emotion_failed(error):
+    metrics.inc("text_emotion_source_total", source="error")
+    metrics.inc("llm_errors_total", call="emotion")
+    log.warning("llm request failed", extra={"call": "emotion", "error": str(error)})
+    return "neutral", "分析失败"
+
+def analyze_text_emotion(text):
+    with metrics.span("text_emotion"):
+        local = _local_text_emotion(text)
+        if local is not None:
+            metrics.inc("text_emotion_source_total", source="local")
+            return local
+        cached = emotion_cache.lookup(text)
+        if cached is not None:
+            metrics.inc("text_emotion_source_total", source="cache")
+            return cached
+        try:
+            result = llm_client.chat_completion(_text_emotion_payload(text),
+                                                read_timeout=TEXT_EMOTION_READ_TIMEOUT)
+            emotion = _parse_text_emotion(result)
+        except Exception as e:
+            return _text_emotion_failed(e)
+    metrics.inc("text_emotion_source_total", source="llm")
+    emotion_cache.store(text, emotion)
+    return emotion
+
+async def aanalyze_text_emotion(text):
+    """analyze_text_emotion 的异步版本"""
+    with metrics.span("text_emotion"):
+        local = _local_text_emotion(text)
+        if local is not None:
+            metrics.inc("text_emotion_source_total", source="local")
+            return local
+        cached = await emotion_cache.alookup(text)
+        if cached is not None:
+            metrics.inc("text_emotion_source_total", source="cache")
+            return cached
+        try:
+            result = await llm_client.achat_completion(_text_emotion_payload(text),
+                                                       read_timeout=TEXT_EMOTION_READ_TIMEOUT)
+            emotion = _parse_text_emotion(result)
+        except Exception as e:
+            return _text_emotion_failed(e)
+    metrics.inc("text_emotion_source_total", source="llm")
+    await emotion_cache.astore(text, emotion)
+    return emotion
 
 # ✅ 会话主页（改为固定三只动物）
 @login_required(login_url='/login/')
@@ -140,65 +181,146 @@ def chat_view(request, session_id):
         return render(request, "404.html", status=404)
 
     session_info = animals[session_id]
-    # logs 依然取数据库里的聊天记录
-    logs = ChatLog.objects.filter(session_id=session_id).order_by("created_at")
+    # logs 只渲染最近一页，更早的记录由前端通过 chat_history_view 按游标加载
+    logs, older_cursor = pagination.latest_page(ChatLog.objects.filter(session_id=session_id),
+                                                "created_at", CHAT_PAGE_SIZE)
     return render(request, "chat.html", {
         "session": {
             "id": session_id,
             "name": session_info["name"],
             "animal": session_info["animal"]
         },
-        "logs": logs
+        "logs": logs,
+        "older_cursor": older_cursor
+    })
+
+
+# ✅ 分页与条件 GET：ETag 取会话最新一条记录的 id，没有新记录时轮询直接拿到 304
+CHAT_PAGE_SIZE = 50
+TREND_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+def _page_size(request, default):
+    try:
+        limit = int(request.GET.get("limit", default))
+    except ValueError:
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _chat_etag(request, session_id):
+    latest = (ChatLog.objects.filter(session_id=session_id)
+              .order_by("-created_at", "-id").values_list("id", flat=True).first())
+    return f"chat-{session_id}-{latest or 0}"
+
+def _emotion_etag(request, session_id):
+    latest = (EmotionLog.objects.using(settings.TREND_READ_DATABASE).filter(session_id=session_id)
+              .order_by("-timestamp", "-id").values_list("id", flat=True).first())
+    return f"emotion-{session_id}-{latest or 0}"
+
+# ✅ 更早的聊天记录（?before=<游标>&limit=）
+@login_required(login_url='/login/')
+@condition(etag_func=_chat_etag)
+def chat_history_view(request, session_id):
+    try:
+        logs, older_cursor = pagination.latest_page(ChatLog.objects.filter(session_id=session_id), "created_at",
+                                                    _page_size(request, CHAT_PAGE_SIZE), request.GET.get("before"))
+    except pagination.InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "messages": [
+            {
+                "user": log.user_message,
+                "bot": log.gpt_response,
+                "created_at": timezone.localtime(log.created_at).isoformat(),
+            }
+            for log in logs
+        ],
+        "older_cursor": older_cursor,
     })
 
 
-# ✅ 聊天逻辑
+# ✅ 聊天逻辑（异步：情绪分析与回复生成并发执行，经 asgi.py 部署时不占用工作线程）
+@sync_to_async
+@transaction.atomic
+def save_turn(session, user_input, camera_emotion, text_emotion, response_text):
+    """一轮对话的 ChatLog 与 EmotionLog 在同一个事务里写入（汇总表/统计的信号也在其中）"""
+    chat_log = ChatLog.objects.create(session=session, user_message=user_input,
+                                      camera_emotion=camera_emotion, text_emotion=text_emotion,
+                                      gpt_response=response_text)
+    EmotionLog.objects.create(session=session, chat_log=chat_log, timestamp=chat_log.created_at,
+                              camera_emotion=camera_emotion, text_emotion=text_emotion)
+    return chat_log
+
+async def _claim_care_message(client_key, language, camera_emotion, final_emotion):
+    """需要关心用户且距上次询问超过 5 分钟时，返回关心语并记录时间；否则返回空字符串"""
+    should_show_care = (
+        camera_emotion in emotion_state.NEGATIVE_EMOTIONS or
+        final_emotion in emotion_state.NEGATIVE_EMOTIONS
+    )
+    if should_show_care and await emotion_state.get_store().aclaim_care(client_key):
+        return "你还好吗？想聊聊嘛？" if language.startswith("zh") else "Are you okay? Want to talk?"
+    return ""
+
+async def _analyze_and_reply(user_input, style, context):
+    """
+    返回 ((emotion, reason), reply)。
+    - separate（默认）：回复不依赖情绪分类结果，两个 LLM 请求同时发出
+    - combined：本地分类器/缓存没有结果时只发一次请求，同时拿到情绪和回复；输出不合法则退回 separate
+    """
+    history, summary = context["turns"], context["summary"]
+    if getattr(settings, "CHAT_RESPONSE_MODE", "separate") == "combined":
+        known = _local_text_emotion(user_input) or await emotion_cache.alookup(user_input)
+        if known is not None:
+            return known, await agenerate_response(user_input, style, history, summary=summary)
+        combined = await acombined_response(user_input, style, history, summary=summary)
+        if combined is not None:
+            emotion, reason, reply = combined
+            await emotion_cache.astore(user_input, (emotion, reason))
+            return (emotion, reason), reply
+
+    return await asyncio.gather(
+        aanalyze_text_emotion(user_input),
+        agenerate_response(user_input, style, history, summary=summary),
+    )
+
+def _overloaded(e):
+    response = JsonResponse({"error": "server busy, please retry", "retry_after": e.retry_after}, status=503)
+    response["Retry-After"] = str(e.retry_after)
+    return response
+
 @csrf_exempt
-def chat_api(request, session_id):
-    session = get_object_or_404(ChatSession, id=session_id)
+@throttle("chat")
+async def chat_api(request, session_id):
+    session = await aget_object_or_404(ChatSession, id=session_id)
     data = json.loads(request.body)
     user_input = data.get("message", "").strip()
     style = data.get("style", "friend")
     camera_emotion = data.get("emotion", "neutral").strip().lower()
     camera_emotion = camera_emotion if camera_emotion in VALID_EMOTIONS else "neutral"
 
-    language = detect_language(user_input)
-    gpt_emotion, reason = analyze_text_emotion(user_input)
-    final_emotion = local_emotion_correction(user_input, gpt_emotion)
-
-    history = [{"user": log.user_message, "bot": log.gpt_response}
-               for log in ChatLog.objects.filter(session=session).order_by("-created_at")[:10][::-1]]
-
-    response_text = generate_response(user_input, style, history)
+    client_key = await emotion_state.aclient_key(request)
+    with metrics.span("lang"):
+        language = detect_language(user_input, client_key)
+    with metrics.span("history"):
+        context = await conversation.aget_window(session.id)
 
-    # ✅ 修复 5 分钟内不重复询问的问题
-    now = timezone.now()
-    last_care_time_str = request.session.get("last_care_time")
-    last_care_time = None
-    if last_care_time_str:
-        try:
-            parsed_time = datetime.fromisoformat(last_care_time_str)
-            last_care_time = make_aware(parsed_time) if is_naive(parsed_time) else parsed_time
-        except ValueError:
-            last_care_time = None  # 忽略错误格式
-
-    should_show_care = (
-        camera_emotion in {"sad", "angry", "fear", "disgust"} or
-        final_emotion in {"sad", "angry", "fear", "disgust"}
-    )
+    # ✅ 同时进行的 LLM 调用有上限，排队过长或等待超时直接返回 503
+    try:
+        async with admission.llm_gate().aslot():
+            (gpt_emotion, reason), response_text = await _analyze_and_reply(user_input, style, context)
+    except admission.Overloaded as e:
+        return _overloaded(e)
+    final_emotion = local_emotion_correction(user_input, gpt_emotion)
 
-    if should_show_care and (not last_care_time or (now - last_care_time).total_seconds() > 300):
-        care_msg = "你还好吗？想聊聊嘛？" if language.startswith("zh") else "Are you okay? Want to talk?"
+    care_msg = await _claim_care_message(client_key, language, camera_emotion, final_emotion)
+    if care_msg:
         response_text = care_msg + "\n\n" + response_text
-        request.session["last_care_time"] = now.isoformat()
-        request.session.modified = True
 
     # ✅ 记录日志
-    ChatLog.objects.create(session=session, user_message=user_input,
-                           camera_emotion=camera_emotion, text_emotion=final_emotion,
-                           gpt_response=response_text)
-    EmotionLog.objects.create(session=session, user_message=user_input,
-                              camera_emotion=camera_emotion, text_emotion=final_emotion)
+    with metrics.span("db_write"):
+        await save_turn(session, user_input, camera_emotion, final_emotion, response_text)
+    await conversation.aappend(session.id, user_input, response_text)
 
     return JsonResponse({
         "response": response_text,
@@ -209,54 +331,160 @@ def chat_api(request, session_id):
     })
 
 
-# ✅ 摄像头情绪识别
-from django.utils import timezone  # 确保这行在文件开头已导入
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
+# ✅ 流式聊天（SSE）：先推送 token，情绪分析在后台并发进行，结束后再写入 ChatLog
 @csrf_exempt
-def detect_emotion(request):
-    if request.method == 'POST':
-        image_file = request.FILES.get('frame')
+@throttle("chat")
+async def chat_stream_api(request, session_id):
+    if admission.llm_gate().saturated():
+        return _overloaded(admission.Overloaded("llm"))
+    session = await aget_object_or_404(ChatSession, id=session_id)
+    data = json.loads(request.body)
+    user_input = data.get("message", "").strip()
+    style = data.get("style", "friend")
+    camera_emotion = data.get("emotion", "neutral").strip().lower()
+    camera_emotion = camera_emotion if camera_emotion in VALID_EMOTIONS else "neutral"
+
+    client_key = await emotion_state.aclient_key(request)
+    with metrics.span("lang"):
+        language = detect_language(user_input, client_key)
+    with metrics.span("history"):
+        context = await conversation.aget_window(session.id)
+
+    async def events():
+        chunks = []
+        emotion_task = None
         try:
-            img = Image.open(image_file)
-            img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-            result = emotion_detector.detect_emotions(img_cv)
-            emotion = max(result[0]['emotions'], key=result[0]['emotions'].get) if result else 'neutral'
-        except:
-            emotion = 'neutral'
-
-        # 负面情绪检测逻辑
-        negative_emotions = {"sad", "angry", "fear", "disgust"}
-        alert = False
-
-        if emotion in negative_emotions:
-            count = request.session.get("negative_count", 0) + 1
-            request.session["negative_count"] = count
-        else:
-            request.session["negative_count"] = 0
-
-        # ✅ 添加：3分钟内不重复提醒
-        if request.session["negative_count"] >= 3:
-            now = timezone.now()
-            last_alert_time_str = request.session.get("last_alert_time")
-            last_alert_time = timezone.datetime.fromisoformat(last_alert_time_str) if last_alert_time_str else None
-
-            if not last_alert_time or (now - last_alert_time).total_seconds() > 180:
-                alert = True
-                request.session["last_alert_time"] = now.isoformat()
-            request.session["negative_count"] = 0  # 重置计数（无论是否弹窗）
-
-        return JsonResponse({
-            'emotion': emotion,
-            'alert': alert,
-            'alert_message': "You don't seem okay. Want to talk?" if alert else ""
+            # 名额在生成结束前一直占用；排队失败时以 error 事件告知前端
+            async with admission.llm_gate().aslot():
+                emotion_task = asyncio.ensure_future(aanalyze_text_emotion(user_input))
+                async for chunk in astream_response(user_input, style, context["turns"], summary=context["summary"]):
+                    chunks.append(chunk)
+                    yield _sse("token", {"text": chunk})
+                gpt_emotion, reason = await emotion_task
+        except admission.Overloaded as e:
+            yield _sse("error", {"error": "server busy, please retry", "retry_after": e.retry_after})
+            return
+        finally:
+            if emotion_task is not None and not emotion_task.done():
+                emotion_task.cancel()
+
+        final_emotion = local_emotion_correction(user_input, gpt_emotion)
+        response_text = "".join(chunks).strip()
+
+        # ✅ 关心语仍作为回复前缀保存；前端收到 care 事件后插到气泡最前面
+        care_msg = await _claim_care_message(client_key, language, camera_emotion, final_emotion)
+        if care_msg:
+            response_text = care_msg + "\n\n" + response_text
+            yield _sse("care", {"text": care_msg})
+
+        with metrics.span("db_write"):
+            await save_turn(session, user_input, camera_emotion, final_emotion, response_text)
+        await conversation.aappend(session.id, user_input, response_text)
+
+        yield _sse("done", {
+            "response": response_text,
+            "camera_emotion": camera_emotion,
+            "text_emotion": final_emotion,
+            "reason": reason,
+            "language": language
         })
 
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # 关闭 nginx 缓冲，保证首个 token 立即送达
+    return response
+
+
+def _analyze_upload(client_key, image_file):
+    started = time.perf_counter()
+    img_cv = vision.decode_frame(image_file)
+    decoded = time.perf_counter()
+    metrics.record("decode", decoded - started)
+    result = analyze_frame(client_key, img_cv)
+    result['timing']['decode_ms'] = round((decoded - started) * 1000, 2)
+    return result
+
+
+# ✅ 摄像头情绪识别：在事件循环上排队等推理名额，解码和推理放到线程池，不占用同步视图共用的线程
+@csrf_exempt
+@throttle("camera")
+async def detect_emotion(request):
+    if request.method == 'POST':
+        if not vision.camera_enabled():
+            return JsonResponse({'error': 'camera inference is disabled on this node'}, status=503)
+
+        client_key = await emotion_state.aclient_key(request)
+        try:
+            # 先检查大小再解析请求体，超过 FRAME_MAX_BYTES 的帧不会写到临时文件
+            image_file = vision.read_upload(request)
+            async with admission.inference_gate().aslot():
+                result = await asyncio.to_thread(_analyze_upload, client_key, image_file)
+        except vision.InvalidFrame as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        return JsonResponse(result)
+
+
+def analyze_frame(client_key, img_cv):
+    """
+    解码后的一帧 → 情绪与提醒结果。HTTP 接口和 WebSocket 共用，保证提醒规则一致。
+    阻塞调用（可能做模型推理）：调用方先在事件循环上拿到推理名额（admission.inference_gate().aslot()），
+    再放到线程中执行，排队不占线程。
+    """
+    started = time.perf_counter()
+
+    def infer(img):
+        result = vision.detect_emotions(img)
+        return max(result[0]['emotions'], key=result[0]['emotions'].get) if result else 'neutral'
+
+    # ✅ 画面与上次推理时几乎相同则复用最近结果（平滑后），不重复推理
+    try:
+        emotion, source = frame_skip.get_filter().process(client_key, img_cv, infer)
+    except Exception:
+        emotion, source = 'neutral', 'computed'
+    elapsed = time.perf_counter() - started
+    metrics.record("inference", elapsed)
+    metrics.inc("camera_frames_total", source=source)
+    inference_ms = round(elapsed * 1000, 2)
+
+    # 负面情绪计数与 3 分钟内不重复提醒，状态存在 emotion_state 的存储里（默认共享缓存），不再每帧写 session
+    alert = emotion_state.get_store().record_detection(client_key, emotion)
+
+    return {
+        'emotion': emotion,
+        'alert': alert,
+        'alert_message': "You don't seem okay. Want to talk?" if alert else "",
+        'source': source,
+        'timing': {'inference_ms': inference_ms},
+    }
+
 
 # ✅ 情绪趋势图（🚧改为返回JSON数据用于前端绘图）
+# 默认返回最近一页；?until=<游标> 取更早的一页，?since=<游标> 只取之后新增的记录（轮询用）
 @login_required(login_url='/login/')
+@condition(etag_func=_emotion_etag)
 def trend_view(request, session_id):
-    session = get_object_or_404(ChatSession, id=session_id)
-    logs = EmotionLog.objects.filter(session=session).order_by("timestamp")
+    db = settings.TREND_READ_DATABASE
+    session = get_object_or_404(ChatSession.objects.using(db), id=session_id)
+    logs = EmotionLog.objects.using(db).filter(session=session)
+    limit = _page_size(request, TREND_PAGE_SIZE)
+    since = request.GET.get("since")
+
+    try:
+        if since:
+            logs = list(pagination.after(logs, "timestamp", since)[:limit + 1])
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+            older_cursor = None
+        else:
+            logs, older_cursor = pagination.latest_page(logs, "timestamp", limit, request.GET.get("until"))
+            has_more = False
+    except pagination.InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     trend_data = [
         {
@@ -267,28 +495,87 @@ def trend_view(request, session_id):
         for log in logs
     ]
 
-    return JsonResponse(trend_data, safe=False)
-import statistics
+    return JsonResponse({
+        "items": trend_data,
+        # 下次轮询带上 since；until 不为空时可以继续往前翻
+        "since": pagination.encode_cursor(logs[-1].timestamp, logs[-1].pk) if logs else since,
+        "until": older_cursor,
+        "has_more": has_more,
+    })
+
+
+# ✅ 分桶趋势数据：只读汇总表，开销与桶数成正比
+ROLLUP_DEFAULT_BUCKETS = 120
+ROLLUP_MAX_BUCKETS = 2000
+
+def _parse_time(value):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"invalid datetime: {value}")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+def _rollup_range(request):
+    """
+    解析 ?resolution=&start=&end=，返回 (resolution, start, end)；参数不合法时抛 ValueError。
+    不传 end 时取当前桶的结束时刻（而不是 now），同一个桶内多次请求的范围和 ETag 保持不变。
+    """
+    resolution = request.GET.get("resolution", "hour")
+    if resolution not in rollups.RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(rollups.RESOLUTIONS)}")
+    step = rollups.RESOLUTIONS[resolution][1]
+    start = _parse_time(request.GET.get("start"))
+    end = _parse_time(request.GET.get("end")) or rollups.bucket_start(timezone.now(), resolution) + step
+    if start is None:
+        start = end - step * ROLLUP_DEFAULT_BUCKETS
+    if start >= end:
+        raise ValueError("start must be before end")
+    if (end - start) / step > ROLLUP_MAX_BUCKETS:
+        raise ValueError(f"range covers more than {ROLLUP_MAX_BUCKETS} buckets")
+    return resolution, start, end
+
+def _rollup_etag(request, session_id):
+    # 默认时间窗口随时间移动，ETag 要带上实际的范围
+    try:
+        resolution, start, end = _rollup_range(request)
+    except ValueError:
+        return None
+    return f"{_emotion_etag(request, session_id)}-{resolution}-{start.timestamp()}-{end.timestamp()}"
+
+@login_required(login_url='/login/')
+@condition(etag_func=_rollup_etag)
+def trend_rollup_view(request, session_id):
+    db = settings.TREND_READ_DATABASE
+    session = get_object_or_404(ChatSession.objects.using(db), id=session_id)
+    try:
+        resolution, start, end = _rollup_range(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    buckets = rollups.query(session.id, resolution, start, end, using=db)
+    return JsonResponse({
+        "resolution": resolution,
+        "start": timezone.localtime(start).isoformat(),
+        "end": timezone.localtime(end).isoformat(),
+        "buckets": [dict(b, bucket=timezone.localtime(b["bucket"]).isoformat()) for b in buckets],
+    })
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import ChatSession, EmotionLog
+from .models import ChatSession, EmotionLog, EmotionStats
 
 def analyze_emotion_suggestions(camera_emotions):
-    emotion_scores = {
-        "happy": 1,
-        "neutral": 2,
-        "surprise": 3,
-        "fear": 4,
-        "disgust": 4,
-        "sad": 5,
-        "angry": 5
-    }
-    scores = [emotion_scores.get(e, 2) for e in camera_emotions if e in emotion_scores]
-    if not scores:
-        return "C", "We couldn't gather enough emotion data. Try using the system longer."
+    stats = emotion_stats.RunningStats()
+    for e in camera_emotions:
+        if e in emotion_stats.EMOTION_SCORES:
+            stats.add(emotion_stats.EMOTION_SCORES[e])
+    return suggestion_for(*emotion_stats.summarize(stats))
 
-    avg = sum(scores) / len(scores)
-    std_dev = statistics.stdev(scores) if len(scores) > 1 else 0
+
+def suggestion_for(count, avg, std_dev):
+    """由累计统计（条数、均值、标准差）给出等级和建议"""
+    if not count:
+        return "C", "We couldn't gather enough emotion data. Try using the system longer."
 
     if avg < 1.6:
         level = "A"
@@ -331,13 +618,26 @@ def analyze_emotion_suggestions(camera_emotions):
 
 @login_required(login_url='/login/')
 def trend_page_view(request, session_id):
-    session = get_object_or_404(ChatSession, id=session_id)
-    logs = EmotionLog.objects.filter(session=session).order_by("timestamp")
-    camera_emotions = [log.camera_emotion for log in logs]
-    level, suggestion = analyze_emotion_suggestions(camera_emotions)
+    db = settings.TREND_READ_DATABASE
+    session = get_object_or_404(ChatSession.objects.using(db), id=session_id)
+    stats = EmotionStats.objects.using(db).filter(session=session).first()
+    level, suggestion = suggestion_for(*emotion_stats.summarize(stats))
 
     return render(request, 'trend.html', {
         'session_id': session_id,
         'emotion_level': level,
         'suggestion': suggestion
     })
+
+
+# ✅ Prometheus 抓取接口：METRICS_TOKEN 非空时凭 Bearer token 访问；
+# 没有 token 时只在 DEBUG 下允许 METRICS_ALLOWED_IPS（客户端 IP 的取法与限流相同，见 throttle.client_ip）
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        authorized = hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+    else:
+        authorized = settings.DEBUG and client_ip(request) in settings.METRICS_ALLOWED_IPS
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,182 @@
+"""
+摄像头推理相关的重依赖（cv2 / numpy / PIL / fer → TensorFlow）全部延迟到第一次用到时才导入，
+只处理文字聊天的进程、manage.py 命令和测试都不再为它们付启动成本。
+
+- settings.CAMERA_INFERENCE_ENABLED = False 时彻底关闭摄像头推理（纯文字节点）
+- warm_up() 可在 worker 启动后主动调用，把模型加载挪出第一个请求
+"""
+import io
+import threading
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from . import face_client
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+class CameraInferenceDisabled(Exception):
+    """本节点关闭了摄像头推理"""
+
+
+def camera_enabled():
+    return getattr(settings, "CAMERA_INFERENCE_ENABLED", True)
+
+
+def get_detector():
+    """进程内的 FER 实例，首次调用时才导入 fer 并加载模型"""
+    global _detector
+    if not camera_enabled():
+        raise CameraInferenceDisabled()
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                from fer import FER
+                _detector = FER()
+    return _detector
+
+
+class InvalidFrame(ValueError):
+    """上传的帧无法解码或超过大小上限"""
+
+
+# multipart 边界、字段头等额外开销的余量，Content-Length 超过 FRAME_MAX_BYTES 加上它就直接拒绝
+UPLOAD_OVERHEAD = 16 * 1024
+
+
+class FrameUploadHandler(FileUploadHandler):
+    """只在内存里接收上传的帧；超过上限立即停止解析，不写临时文件"""
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = io.BytesIO()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        return InMemoryUploadedFile(self.file, self.field_name, self.file_name, self.content_type,
+                                    file_size, self.charset, self.content_type_extra)
+
+
+def read_upload(request, field="frame"):
+    """
+    从 multipart 请求里取出帧文件（可能为 None）。必须在第一次访问 request.POST / FILES 之前调用：
+    先按 Content-Length 拒绝过大的请求，再换成只在内存接收的上传处理器。过大时抛 InvalidFrame。
+    """
+    max_bytes = getattr(settings, "FRAME_MAX_BYTES", 2 * 1024 * 1024)
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > max_bytes + UPLOAD_OVERHEAD:
+        raise InvalidFrame(f"frame larger than {max_bytes} bytes")
+    handler = FrameUploadHandler(request, max_bytes)
+    request.upload_handlers = [handler]
+    image_file = request.FILES.get(field)
+    if handler.too_large:
+        raise InvalidFrame(f"frame larger than {max_bytes} bytes")
+    return image_file
+
+
+# cv2 解码 JPEG 时可直接按 1/2、1/4、1/8 缩小，省掉全分辨率解码和后续缩放
+_REDUCED_FLAGS = ((8, "IMREAD_REDUCED_COLOR_8"), (4, "IMREAD_REDUCED_COLOR_4"), (2, "IMREAD_REDUCED_COLOR_2"))
+
+
+def _jpeg_size(data):
+    """只解析 JPEG 的 SOF 段拿到 (宽, 高)，不解码像素；解析失败返回 None"""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + length
+    return None
+
+
+def decode_frame(image_file):
+    """
+    上传的图片 → 检测器需要的 BGR ndarray（uint8，3 通道）。
+    直接从上传的字节解码；JPEG 按 FRAME_DECODE_MAX_SIDE 以缩小比例解码，其它格式解码后过大时再缩小。
+    灰度 / RGBA 等格式统一转成 3 通道 BGR。
+    """
+    max_bytes = getattr(settings, "FRAME_MAX_BYTES", 2 * 1024 * 1024)
+    if image_file is None:
+        raise InvalidFrame("missing frame")
+    if image_file.size > max_bytes:
+        raise InvalidFrame(f"frame larger than {max_bytes} bytes")
+    return decode_bytes(image_file.read())
+
+
+def decode_bytes(data):
+    """decode_frame 的核心部分，直接接收编码后的图片字节（WebSocket 二进制帧也走这里）"""
+    import cv2
+    import numpy as np
+
+    if not data:
+        raise InvalidFrame("empty frame")
+    max_bytes = getattr(settings, "FRAME_MAX_BYTES", 2 * 1024 * 1024)
+    if len(data) > max_bytes:
+        raise InvalidFrame(f"frame larger than {max_bytes} bytes")
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    max_side = getattr(settings, "FRAME_DECODE_MAX_SIDE", 320)
+
+    flag = cv2.IMREAD_COLOR
+    size = _jpeg_size(data) if data[:2] == b"\xff\xd8" else None
+    if size:
+        for factor, name in _REDUCED_FLAGS:
+            if max(size) // factor >= max_side:
+                flag = getattr(cv2, name)
+                break
+
+    try:
+        img = cv2.imdecode(buf, flag)
+    except cv2.error as e:
+        raise InvalidFrame("cannot decode frame") from e
+    if img is None:
+        raise InvalidFrame("cannot decode frame")
+
+    height, width = img.shape[:2]
+    if max(height, width) > max_side * 2:
+        scale = max_side / max(height, width)
+        img = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def detect_emotions(img_cv):
+    """配置了推理进程就交给它，否则在本进程推理"""
+    if not camera_enabled():
+        raise CameraInferenceDisabled()
+    worker = face_client.get_client()
+    if worker is not None:
+        return worker.detect_emotions(img_cv)
+    return get_detector().detect_emotions(img_cv)
+
+
+def warm_up():
+    """导入视觉依赖并（无推理进程时）加载模型、跑一帧空图。关闭摄像头推理时什么都不做"""
+    if not camera_enabled():
+        return
+    import numpy as np
+
+    if face_client.get_client() is None:
+        get_detector().detect_emotions(np.zeros((64, 64, 3), dtype=np.uint8))
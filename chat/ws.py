@@ -0,0 +1,140 @@
+"""
+摄像头帧的 WebSocket 通道（纯 ASGI，不依赖 Channels），挂在 companion_project/asgi.py 上。
+
+    ws://<host>/ws/chat/<session_id>/camera/
+
+- 客户端上行：二进制消息，每条是一帧编码后的图片（JPEG/PNG）
+- 服务端下行：JSON 文本，{"type": "emotion", ...} 字段与 /detect-emotion/ 的返回一致，另带 dropped
+- 只处理最新的一帧：推理跟不上时，排队中的旧帧被新帧覆盖并计入 dropped，延迟不会越积越多
+- 身份取自 Django session cookie，负面计数/提醒规则与 HTTP 接口共用 emotion_state
+"""
+import asyncio
+import json
+import re
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+
+from . import admission, vision
+from .models import ChatSession
+from .views import analyze_frame
+
+CAMERA_PATH = re.compile(r"^/(?:api/)?ws/chat/(?P<session_id>\d+)/camera/$")
+
+
+def _headers(scope):
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+
+
+def _origin_allowed(headers):
+    # 浏览器跨站发起的 WebSocket 会自动带上 cookie，要求 Origin 与 Host 一致
+    origin = headers.get("origin")
+    return origin is None or urlsplit(origin).netloc == headers.get("host")
+
+
+async def _client_key(scope, headers):
+    """与 emotion_state.client_key 相同的规则：登录用户 > session > IP"""
+    cookie = SimpleCookie()
+    cookie.load(headers.get("cookie", ""))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is not None:
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore(morsel.value)
+        user_id = await session.aget(SESSION_KEY)
+        if user_id is not None:
+            return f"user:{user_id}"
+        if await session.aexists(morsel.value):
+            return f"session:{morsel.value}"
+    client = scope.get("client") or ("", 0)
+    return f"ip:{client[0]}"
+
+
+def _process(client_key, data):
+    started = time.perf_counter()
+    img_cv = vision.decode_bytes(data)
+    decode_ms = round((time.perf_counter() - started) * 1000, 2)
+    result = analyze_frame(client_key, img_cv)
+    result["timing"]["decode_ms"] = decode_ms
+    return result
+
+
+async def camera_socket(scope, receive, send, session_id):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    headers = _headers(scope)
+    if not _origin_allowed(headers):
+        await send({"type": "websocket.close", "code": 4403})
+        return
+    if not vision.camera_enabled():
+        await send({"type": "websocket.close", "code": 4503})
+        return
+    if not await ChatSession.objects.filter(id=session_id).aexists():
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    client_key = await _client_key(scope, headers)
+    await send({"type": "websocket.accept"})
+
+    latest = None          # 待处理的最新一帧，只保留一帧
+    dropped = 0
+    frame_ready = asyncio.Event()
+    closed = asyncio.Event()
+
+    async def reader():
+        nonlocal latest, dropped
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                closed.set()
+                frame_ready.set()
+                return
+            data = message.get("bytes")
+            if data:
+                if latest is not None:
+                    dropped += 1
+                latest = data
+                frame_ready.set()
+
+    async def processor():
+        nonlocal latest, dropped
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if closed.is_set():
+                return
+            data, latest = latest, None
+            skipped, dropped = dropped, 0
+            if data is None:
+                continue
+            try:
+                async with admission.inference_gate().aslot():
+                    result = await asyncio.to_thread(_process, client_key, data)
+                payload = dict(result, type="emotion", dropped=skipped)
+            except vision.InvalidFrame as e:
+                payload = {"type": "error", "error": str(e)}
+            except admission.Overloaded as e:
+                payload = {"type": "error", "error": "server busy", "retry_after": e.retry_after}
+            await send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    reader_task = asyncio.create_task(reader())
+    processor_task = asyncio.create_task(processor())
+    try:
+        await asyncio.wait({reader_task, processor_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (reader_task, processor_task):
+            task.cancel()
+
+
+async def websocket_application(scope, receive, send):
+    match = CAMERA_PATH.match(scope["path"])
+    if match is None:
+        await receive()  # websocket.connect
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    await camera_socket(scope, receive, send, int(match["session_id"]))
@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+The async chat endpoint (chat.views.chat_api) only gets its concurrency
+benefit when served through this module, e.g.:
+
+    gunicorn companion_project.asgi:application -k uvicorn.workers.UvicornWorker
+
+WebSocket connections (the camera channel, see chat/ws.py) are routed here as
+well; everything else goes to the regular Django ASGI handler.
 """
 
 import os
@@ -13,4 +21,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "companion_project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chat.ws import websocket_application  # noqa: E402  需在 Django 初始化之后导入
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # ✅ 从环境变量中读取 SECRET_KEY，若不存在则使用默认值
@@ -23,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "chat.middleware.ServerTimingMiddleware",  # ✅ 放在最外层，总耗时包含其余中间件
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,13 +54,197 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "companion_project.wsgi.application"
+ASGI_APPLICATION = "companion_project.asgi.application"
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# ✅ 数据库：DB_ENGINE=sqlite（默认）或 postgres
+# SQLite：WAL 模式让读写互不阻塞；写锁冲突时最多等待 DB_BUSY_TIMEOUT 秒；事务一开始就拿写锁（IMMEDIATE），
+#   避免读锁升级写锁时直接报 "database is locked"。synchronous=NORMAL 在 WAL 下断电最多丢最后几个事务，不会损坏数据库
+# PostgreSQL：默认使用 psycopg 连接池（DB_POOL=True，需 psycopg[pool]），不用持久连接。
+#   ASGI 下 sync_to_async 线程里打开的持久连接不能可靠地关闭或复用（Django ticket #33497），会耗尽数据库连接；
+#   DB_POOL=False 时默认每个请求新建连接，DB_CONN_MAX_AGE>0 的持久连接只在 WSGI（gunicorn 同步 worker）部署下使用。
+#   设置 DB_REPLICA_HOST 时增加只读别名 replica，趋势相关接口从副本读取
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+if DB_ENGINE == "postgres":
+    _postgres = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("DB_NAME", "fluffycare"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if os.environ.get("DB_POOL", "True") == "True":
+        # 连接池与持久连接不能同时使用
+        _postgres["CONN_MAX_AGE"] = 0
+        _postgres["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        }
+    DATABASES = {"default": _postgres}
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASES["replica"] = {
+            **_postgres,
+            "HOST": os.environ["DB_REPLICA_HOST"],
+            "PORT": os.environ.get("DB_REPLICA_PORT", _postgres["PORT"]),
+            "OPTIONS": {**_postgres["OPTIONS"], "options": "-c default_transaction_read_only=on"},
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", str(BASE_DIR / "db.sqlite3")),
+            "OPTIONS": {
+                "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL",
+                "timeout": float(os.environ.get("DB_BUSY_TIMEOUT", "20")),  # 即 busy timeout
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
     }
+
+# ✅ 趋势数据 / 趋势页 / 分桶接口读取的数据库别名（有 replica 时读副本，可能落后主库几秒）
+TREND_READ_DATABASE = os.environ.get("TREND_READ_DATABASE", "replica" if "replica" in DATABASES else "default")
+
+# ✅ 缓存：default 为进程内缓存；shared 为同机多个 worker 共享的缓存（默认文件缓存，可换成 Redis 等）
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": os.environ.get("SHARED_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("SHARED_CACHE_LOCATION", str(BASE_DIR / ".cache")),
+    },
 }
+# 文件缓存超过 MAX_ENTRIES（Django 默认 300）就随机删掉三分之一，限流桶、会话等会一起丢；
+# 这里调大上限。用户多时改用 Redis：SHARED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+if CACHES["shared"]["BACKEND"].endswith(("FileBasedCache", "LocMemCache")):
+    CACHES["shared"]["OPTIONS"] = {"MAX_ENTRIES": int(os.environ.get("SHARED_CACHE_MAX_ENTRIES", "20000"))}
+
+# ✅ 会话存储：SESSION_BACKEND=cached_db（默认，读走 shared 缓存、写同时落库）/ db / cache / signed_cookies
+# signed_cookies 把会话数据签名后整个放在 cookie 里（客户端可读、不可改），不查任何表；登出后旧 cookie 在过期前仍然有效
+# cache 只存缓存、不落库，缓存条目被淘汰就等于登出，只能配合 Redis / Memcached 这类不随机删条目的缓存使用
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "cached_db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_BACKEND]
+# 多个 worker 必须共用同一个缓存，否则一个 worker 登出后其他 worker 仍可能读到旧会话
+SESSION_CACHE_ALIAS = os.environ.get("SESSION_CACHE_ALIAS", "shared")
+if SESSION_BACKEND == "cache" and CACHES[SESSION_CACHE_ALIAS]["BACKEND"].endswith(("FileBasedCache", "LocMemCache")):
+    raise ImproperlyConfigured(
+        "SESSION_BACKEND=cache needs a cache that does not cull entries (e.g. Redis); "
+        f"{CACHES[SESSION_CACHE_ALIAS]['BACKEND']} would randomly log users out. Use cached_db instead.")
+
+# ✅ 文字情绪分类缓存：进程内 LRU 容量/TTL（秒），以及可选的第二层共享缓存别名（如 "shared"）
+TEXT_EMOTION_CACHE_SIZE = int(os.environ.get("TEXT_EMOTION_CACHE_SIZE", "5000"))
+TEXT_EMOTION_CACHE_TTL = int(os.environ.get("TEXT_EMOTION_CACHE_TTL", "86400"))
+TEXT_EMOTION_CACHE_ALIAS = os.environ.get("TEXT_EMOTION_CACHE_ALIAS") or None
+
+# ✅ 文字情绪分类方式：local 仅本地分类器 / hybrid 本地置信度不足时再调 LLM / llm 仅 LLM
+TEXT_EMOTION_MODE = os.environ.get("TEXT_EMOTION_MODE", "hybrid")
+TEXT_EMOTION_CONFIDENCE_THRESHOLD = float(os.environ.get("TEXT_EMOTION_CONFIDENCE_THRESHOLD", "0.7"))
+# ✅ 情绪关键词词表（JSON），留空使用 chat/data/emotion_keywords.json
+EMOTION_KEYWORDS_FILE = os.environ.get("EMOTION_KEYWORDS_FILE") or None
+
+# ✅ 摄像头推理开关（纯文字节点设为 False，不加载 cv2/fer/TensorFlow）与启动预热
+CAMERA_INFERENCE_ENABLED = os.environ.get("CAMERA_INFERENCE_ENABLED", "True") == "True"
+VISION_WARMUP = os.environ.get("VISION_WARMUP", "False") == "True"
+
+# ✅ 摄像头帧：上传大小上限（超出返回 400），以及解码后的目标长边（像素）
+FRAME_MAX_BYTES = int(os.environ.get("FRAME_MAX_BYTES", str(2 * 1024 * 1024)))
+FRAME_DECODE_MAX_SIDE = int(os.environ.get("FRAME_DECODE_MAX_SIDE", "320"))
+# 上限以内的上传始终留在内存里，不落临时文件（摄像头接口另外换成只在内存接收的上传处理器，见 vision.read_upload）
+FILE_UPLOAD_MAX_MEMORY_SIZE = max(FRAME_MAX_BYTES, 2621440)
+
+# ✅ 连续帧复用：画面差异（0~255）低于阈值且距上次推理不超过 N 秒时复用结果，按最近几次结果平滑
+FRAME_CHANGE_THRESHOLD = float(os.environ.get("FRAME_CHANGE_THRESHOLD", "6"))
+FRAME_MAX_STALENESS = float(os.environ.get("FRAME_MAX_STALENESS", "10"))
+FRAME_SMOOTHING_WINDOW = int(os.environ.get("FRAME_SMOOTHING_WINDOW", "3"))
+
+# ✅ 用户情绪状态（负面计数、提醒/关心时间、最近识别结果）：cache 存到共享缓存（默认，多 worker 共享）
+# memory 为进程内，只适合单 worker：多个 worker 时计数分散在各进程，提醒可能不触发
+EMOTION_STATE_BACKEND = os.environ.get("EMOTION_STATE_BACKEND", "cache")
+EMOTION_STATE_CACHE_ALIAS = os.environ.get("EMOTION_STATE_CACHE_ALIAS", "shared")
+EMOTION_STATE_HISTORY = int(os.environ.get("EMOTION_STATE_HISTORY", "20"))
+
+# ✅ 可观测性：各阶段耗时写入 Server-Timing 响应头；/metrics 输出 Prometheus 文本格式
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "True") == "True"
+# 非 DEBUG 部署必须设置 METRICS_TOKEN 才能访问 /metrics；METRICS_ALLOWED_IPS 只在 DEBUG 且没有 token 时生效
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+
+# ✅ 日志：LOG_FORMAT=text（key=value）或 json（每行一个 JSON 对象）
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "text": {"()": "chat.log_format.KeyValueFormatter"},
+        "json": {"()": "chat.log_format.JsonFormatter"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": os.environ.get("LOG_FORMAT", "text")},
+    },
+    "loggers": {
+        "chat": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+
+# ✅ 限流：每个接口按用户（已登录）或按 IP（未登录）一个令牌桶（"次数/s|min|hour|day"，留空表示不限），超出返回 429
+THROTTLE_ENABLED = os.environ.get("THROTTLE_ENABLED", "True") == "True"
+THROTTLE_CACHE_ALIAS = os.environ.get("THROTTLE_CACHE_ALIAS", "shared")
+# 反向代理的 IP 或网段（逗号分隔），只有来自这些地址的请求才按 X-Forwarded-For 取客户端 IP
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.environ.get("TRUSTED_PROXIES", "").split(",") if proxy.strip()]
+THROTTLE_RATES = {
+    "chat": {
+        "user": os.environ.get("THROTTLE_CHAT_USER", "20/min"),
+        "ip": os.environ.get("THROTTLE_CHAT_IP", "60/min"),
+    },
+    "camera": {
+        "user": os.environ.get("THROTTLE_CAMERA_USER", "60/min"),
+        "ip": os.environ.get("THROTTLE_CAMERA_IP", "180/min"),
+    },
+}
+
+# ✅ 准入控制（每个进程）：同时进行的 LLM 请求 / 表情推理上限，排队超过上限或等待超时返回 503
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "32"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "5"))
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get("INFERENCE_MAX_IN_FLIGHT", str(os.cpu_count() or 2)))
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "16"))
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "2"))
+
+# ✅ 历史上下文的 token 预算（估算值），按最近的轮次倒序放入，放不下就停
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.environ.get("PROMPT_HISTORY_TOKEN_BUDGET", "1200"))
+
+# ✅ 聊天接口的 LLM 调用方式：separate 情绪与回复两次请求并发 / combined 一次请求返回 JSON（流式接口始终 separate）
+CHAT_RESPONSE_MODE = os.environ.get("CHAT_RESPONSE_MODE", "separate")
+
+# ✅ 会话滚动上下文：最近 CONVERSATION_WINDOW_TURNS 轮原文 + 后台生成的早期摘要
+# cache（默认）存在 CONVERSATION_CACHE_ALIAS，多 worker 共享；memory 为进程内，只适合单 worker
+CONVERSATION_BACKEND = os.environ.get("CONVERSATION_BACKEND", "cache")
+CONVERSATION_CACHE_ALIAS = os.environ.get("CONVERSATION_CACHE_ALIAS", "shared")
+CONVERSATION_WINDOW_TURNS = int(os.environ.get("CONVERSATION_WINDOW_TURNS", "8"))
+CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", "4"))
+CONVERSATION_SUMMARY_WORKERS = int(os.environ.get("CONVERSATION_SUMMARY_WORKERS", "2"))
+
+# ✅ 趋势页建议的统计口径：all 全部记录等权 / recent 指数衰减（每条新记录权重为 EMOTION_STATS_ALPHA）
+TREND_SUGGESTION_WEIGHTING = os.environ.get("TREND_SUGGESTION_WEIGHTING", "all")
+EMOTION_STATS_ALPHA = float(os.environ.get("EMOTION_STATS_ALPHA", "0.1"))
+
+# ✅ 独立表情识别推理进程（python manage.py run_face_worker）；地址留空则在 web 进程内推理
+# 地址只能是本机回环地址（127.0.0.1:6010）或 Unix socket 路径
+FACE_WORKER_ADDRESS = os.environ.get("FACE_WORKER_ADDRESS", "")
+# 推理进程会反序列化（pickle）收到的数据，连接密钥必须单独设置（至少 16 个字符的随机串），不复用 SECRET_KEY
+FACE_WORKER_AUTHKEY = os.environ.get("FACE_WORKER_AUTHKEY", "")
+FACE_WORKER_TIMEOUT = float(os.environ.get("FACE_WORKER_TIMEOUT", "2"))
+FACE_WORKER_MAX_BATCH = int(os.environ.get("FACE_WORKER_MAX_BATCH", "16"))
+FACE_WORKER_MAX_WAIT_MS = float(os.environ.get("FACE_WORKER_MAX_WAIT_MS", "10"))
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -82,4 +269,10 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 # ✅ 自定义用户模型
 AUTH_USER_MODEL = "chat.User"
 
+# ✅ 登录页按邮箱认证；ModelBackend 保留给后台按用户名登录
+AUTHENTICATION_BACKENDS = [
+    "chat.backends.EmailBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"